@@ -0,0 +1,142 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from telethon.errors import FloodWaitError
+from telethon.tl.types import Channel, ChatPhotoEmpty, MessageEntityTextUrl, PeerChannel
+
+# Matches Telethon's messages.getHistory page size
+PAGE_SIZE = 100
+FIRST_CHANNEL_ID = 1000
+
+FILLER = [
+    "fresh", "drop", "today", "dm", "for", "price", "the", "new", "method", "works", "on",
+    "all", "cheap", "legit", "vouches", "in", "bio", "update", "join", "now", "fast", "service",
+]
+THREAT_TERMS = [
+    "carding", "fullz", "bank logs", "ransomware", "exploit", "sim swap", "stealer", "phishing kit",
+    "cvv", "botnet", "ddos", "patched", "security update", "bug bounty",
+]
+
+class FakeMessage:
+    def __init__(self, id, text, channel_id, date, entities=None, fwd_from=None):
+        self.id = id
+        self.text = text
+        self.message = text
+        self.sender_id = channel_id
+        self.date = date
+        self.entities = entities
+        self.fwd_from = fwd_from
+
+# Synthetic channel graph: every channel links to `fanout` others, so a crawl
+# from chan00000 reaches the whole graph within a few depths
+class FakeChannelGraph:
+    def __init__(self, channels=200, fanout=4, messages=200, link_density=0.05, forward_rate=0.05, seed=1337):
+        rng = random.Random(seed)
+        self.names = [f"chan{i:05d}" for i in range(channels)]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.messages = {}
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for i, name in enumerate(self.names):
+            channel_id = FIRST_CHANNEL_ID + i
+            targets = [self.names[rng.randrange(channels)] for _ in range(fanout)]
+            history = []
+            for message_id in range(1, messages + 1):
+                words = [rng.choice(FILLER) for _ in range(rng.randint(8, 40))]
+                for _ in range(rng.randint(0, 3)):
+                    words.insert(rng.randrange(len(words) + 1), rng.choice(THREAT_TERMS))
+                entities = None
+                # Every outgoing link is in the newest messages, which any crawl reads first;
+                # older mentions follow link_density
+                newest = messages - message_id < fanout
+                if newest or rng.random() < link_density:
+                    target = targets[messages - message_id] if newest else rng.choice(targets)
+                    if rng.random() < 0.2:
+                        entities = [MessageEntityTextUrl(offset=0, length=4, url=f"https://t.me/{target}")]
+                    else:
+                        words.insert(rng.randrange(len(words) + 1), f"t.me/{target}")
+                fwd_from = None
+                if message_id > 1 and rng.random() < forward_rate:
+                    # Repost an earlier message of an already generated channel (or of this one)
+                    origin = rng.randrange(i + 1)
+                    origin_history = history if origin == i else self.messages[self.names[origin]]
+                    original = origin_history[rng.randrange(len(origin_history))]
+                    fwd_from = SimpleNamespace(from_id=PeerChannel(FIRST_CHANNEL_ID + origin), channel_post=original.id)
+                    words = original.text.split()
+                history.append(FakeMessage(message_id, " ".join(words), channel_id, start + timedelta(minutes=message_id), entities, fwd_from))
+            self.messages[name] = history
+
+    def entity(self, name):
+        i = self.index[name]
+        return Channel(id=FIRST_CHANNEL_ID + i, title=name, photo=ChatPhotoEmpty(), date=None, username=name, access_hash=i)
+
+# Stand-in for TelegramClient covering what the crawler calls: get_entity,
+# client(JoinChannelRequest), iter_messages and iter_dialogs. Every RPC sleeps
+# `latency` seconds, and a `flood_rate` fraction get a FloodWait. Like Telethon, waits of
+# up to `flood_sleep_threshold` seconds are slept inside the RPC, the rest raise FloodWaitError.
+class FakeTelegramClient:
+    def __init__(self, graph, latency=0.005, flood_rate=0.0, flood_seconds=1, seed=1337, flood_sleep_threshold=60):
+        self.graph = graph
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.flood_sleep_threshold = flood_sleep_threshold
+        self.rng = random.Random(seed)
+        self.joined = set()
+        self.calls = {}
+        self.flood_waits = 0
+        self.slept_flood_waits = 0
+
+    async def _rpc(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        await asyncio.sleep(self.latency)
+        if self.flood_rate and self.rng.random() < self.flood_rate:
+            self.flood_waits += 1
+            if self.flood_seconds <= self.flood_sleep_threshold:
+                # Telethon sleeps and repeats the request, unseen by the caller
+                self.slept_flood_waits += 1
+                await asyncio.sleep(self.flood_seconds)
+                return
+            raise FloodWaitError(request=None, capture=self.flood_seconds)
+
+    async def start(self):
+        return self
+
+    async def disconnect(self):
+        pass
+
+    async def get_entity(self, link):
+        await self._rpc('get_entity')
+        name = str(link).rstrip('/').split('/')[-1].lstrip('@').lower()
+        if name not in self.graph.index:
+            raise ValueError(f'No user has "{name}" as username')
+        return self.graph.entity(name)
+
+    async def __call__(self, request):
+        await self._rpc(type(request).__name__)
+        channel = getattr(request, 'channel', None)
+        if getattr(channel, 'username', None):
+            self.joined.add(channel.username)
+
+    async def iter_dialogs(self):
+        await self._rpc('iter_dialogs')
+        for name in sorted(self.joined):
+            yield SimpleNamespace(entity=self.graph.entity(name))
+
+    async def iter_messages(self, entity, limit=None, min_id=0, max_id=0, offset_id=0, reverse=False, search=None, wait_time=None, **kwargs):
+        history = self.graph.messages[entity.username]
+        selected = [
+            message for message in history
+            if message.id > min_id and (not max_id or message.id < max_id) and (not offset_id or message.id < offset_id)
+            and (not search or search.lower() in message.text.lower())
+        ]
+        if not reverse:
+            selected.reverse()
+        if limit is not None:
+            selected = selected[:limit]
+        # One RPC per page, like messages.getHistory / messages.search
+        for position in range(0, max(len(selected), 1), PAGE_SIZE):
+            await self._rpc('iter_messages')
+            for message in selected[position:position + PAGE_SIZE]:
+                yield message
@@ -0,0 +1,64 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors.sia_an import CybersecuritySentimentAnalyzer, build_vader
+from utils.logging import *
+
+FILLER = [
+    "fresh", "drop", "today", "dm", "me", "for", "price", "the", "new", "method", "works",
+    "on", "all", "banks", "cheap", "legit", "vouches", "in", "bio", "update", "channel",
+    "join", "now", "not", "very", "good", "bad", "fast", "service", "only", "serious",
+]
+
+# Synthetic Telegram-style corpus mixing filler, single-token and phrase lexicon entries
+def build_corpus(analyzer, size, seed=1337):
+    rng = random.Random(seed)
+    terms = list(analyzer.cybersecurity_lexicon)
+    corpus = []
+    for _ in range(size):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(6, 40))]
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(terms))
+        if rng.random() < 0.1:
+            words.append("!!!")
+        corpus.append(" ".join(words))
+    return corpus
+
+# Scorer equivalent to the analyzer before phrase matching: stock VADER over the raw dict
+def build_baseline(analyzer):
+    sia = build_vader()
+    sia.lexicon = dict(analyzer.cybersecurity_lexicon)
+    return sia.polarity_scores
+
+def time_scorer(score, corpus):
+    start = time.perf_counter()
+    results = [score(text) for text in corpus]
+    return time.perf_counter() - start, results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark phrase-aware lexicon scoring against stock VADER lookup')
+    parser.add_argument('--messages', type=int, default=100000, help='Number of synthetic messages to score')
+    parser.add_argument('--seed', type=int, default=1337, help='Corpus random seed')
+    args = parser.parse_args()
+
+    analyzer = CybersecuritySentimentAnalyzer()
+    corpus = build_corpus(analyzer, args.messages, args.seed)
+    print_header(f"Lexicon benchmark: {len(corpus)} messages, {analyzer.phrase_index.phrase_count} phrases indexed")
+
+    baseline_time, baseline_scores = time_scorer(build_baseline(analyzer), corpus)
+    phrase_time, phrase_scores = time_scorer(analyzer.polarity_scores, corpus)
+
+    changed = sum(1 for old, new in zip(baseline_scores, phrase_scores) if old['compound'] != new['compound'])
+    baseline_signal = sum(1 for scores in baseline_scores if scores['compound'] != 0)
+    phrase_signal = sum(1 for scores in phrase_scores if scores['compound'] != 0)
+
+    print_info(f"Baseline polarity_scores: {baseline_time:.2f}s ({len(corpus) / baseline_time:,.0f} msg/s)")
+    print_info(f"Phrase-aware polarity_scores: {phrase_time:.2f}s ({len(corpus) / phrase_time:,.0f} msg/s)")
+    print_info(f"Relative cost: {phrase_time / baseline_time:.2f}x")
+    print_info(f"Messages with non-zero compound: baseline {baseline_signal}, phrase-aware {phrase_signal}")
+    print_success(f"Scores changed by phrase/case matching: {changed} ({changed / len(corpus) * 100:.1f}%)")
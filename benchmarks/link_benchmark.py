@@ -0,0 +1,76 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.chat_util import LinkExtractor, clean_link, extract_channel_links
+from utils.logging import *
+
+LINK_FORMS = [
+    "https://t.me/{name}", "t.me/{name}", "t.me/s/{name}", "telegram.me/{name}",
+    "https://t.me/joinchat/{hash}", "https://t.me/+{hash}", "tg://resolve?domain={name}",
+]
+
+# The extractor as it was before the single-pass rewrite, kept as the baseline
+def legacy_extract(text):
+    if not text or not isinstance(text, str):
+        return []
+    links = re.findall(r't\.me/(?:joinchat/)?[a-zA-Z0-9_-]+', text)
+    cleaned = []
+    for link in links:
+        link = link.split(')')[0].strip()
+        if re.match(r'^[a-zA-Z0-9_]{5,}$', link):
+            cleaned.append(link)
+            continue
+        match_obj = re.search(r't\.me/(?:joinchat/)?([a-zA-Z0-9_-]+)', link)
+        if match_obj:
+            cleaned.append(f'https://t.me/joinchat/{match_obj.group(1)}' if 'joinchat' in link else match_obj.group(1))
+    return cleaned
+
+def build_messages(size, link_density, seed=1337):
+    rng = random.Random(seed)
+    names = [f"channel_{i:05d}" for i in range(2000)]
+    messages = []
+    for _ in range(size):
+        words = ["fresh", "drop", "dm", "for", "price", "legit", "vouches", "update"] * rng.randint(1, 6)
+        rng.shuffle(words)
+        entities = []
+        for _ in range(rng.randint(0, link_density)):
+            form = rng.choice(LINK_FORMS).format(name=rng.choice(names), hash=f"AbC{rng.randrange(10 ** 6)}")
+            if rng.random() < 0.2:
+                entities.append(SimpleNamespace(url=form))
+            else:
+                words.insert(rng.randrange(len(words) + 1), form)
+        messages.append(SimpleNamespace(text=" ".join(words), entities=entities))
+    return messages
+
+def time_per_message(extract, messages):
+    start = time.perf_counter()
+    total = sum(len(extract(message)) for message in messages)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(messages) * 1e6, total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Microbenchmark Telegram link extraction per message')
+    parser.add_argument('--messages', type=int, default=100000, help='Number of synthetic messages')
+    parser.add_argument('--link-density', type=int, default=3, help='Maximum links per message')
+    args = parser.parse_args()
+
+    messages = build_messages(args.messages, args.link_density)
+    print_header(f"Link extraction benchmark: {len(messages)} messages, up to {args.link_density} links each")
+
+    legacy_us, legacy_links = time_per_message(lambda m: legacy_extract(m.text), messages)
+    text_us, text_links = time_per_message(lambda m: extract_channel_links(m.text), messages)
+    extractor = LinkExtractor()
+    extractor_us, new_links = time_per_message(lambda m: extractor.extract(m, "source"), messages)
+    clean_us, _ = time_per_message(lambda m: [clean_link(link) for link in extract_channel_links(m.text)], messages)
+
+    print_info(f"Legacy findall + clean_link: {legacy_us:.2f} us/message, {legacy_links} links")
+    print_info(f"extract_channel_links (text only): {text_us:.2f} us/message, {text_links} links")
+    print_info(f"extract_channel_links + clean_link: {clean_us:.2f} us/message")
+    print_info(f"LinkExtractor (text + entities + Bloom dedupe): {extractor_us:.2f} us/message, {new_links} new links, {extractor.duplicates} duplicates dropped")
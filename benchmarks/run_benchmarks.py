@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_telegram import FakeChannelGraph, FakeTelegramClient
+from benchmarks.lexicon_benchmark import build_corpus
+from benchmarks.link_benchmark import build_messages
+from utils.chat_util import clean_link, extract_channel_links
+from utils.logging import *
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Metrics where a larger value is better; every other metric is a time or a size
+HIGHER_IS_BETTER = {'crawl_messages_per_second', 'batch_messages_per_second'}
+# Absolute slack for results small enough that timer noise alone would exceed the tolerance
+NOISE_FLOOR = {'report_seconds': 0.05}
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    scale = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return own / 2 ** 20, children / 2 ** 20
+
+# Best of several rounds: the minimum is the least disturbed by other load on the machine
+def time_per_item(function, items, rounds=5):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for item in items:
+            function(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(items) * 1e6
+
+def run_micro(size):
+    from processors.sia_an import CybersecuritySentimentAnalyzer
+
+    messages = build_messages(size, 3)
+    texts = [message.text for message in messages]
+    links = [link for text in texts for link in text.split() if 't.me' in link or 'tg://' in link] or ['https://t.me/example']
+    analyzer = CybersecuritySentimentAnalyzer(cache_size=0)
+    corpus = build_corpus(analyzer, size)
+    return {
+        'clean_link_us': time_per_item(clean_link, links),
+        'extract_channel_links_us': time_per_item(extract_channel_links, texts),
+        'polarity_scores_us': time_per_item(analyzer.polarity_scores, corpus, rounds=2),
+    }
+
+# run_scraper end to end against the fake client, then BatchProcessor and the
+# report on their own, inside a scratch working directory
+def run_e2e(args, workdir):
+    import telefi
+    from processors.batch import BatchProcessor
+    from processors.scoring import ScoringPool
+    from processors.sia_an import CybersecuritySentimentAnalyzer
+    from processors.sinks import create_batch_sink
+    from utils import metrics
+
+    graph = FakeChannelGraph(args.channels, args.fanout, args.messages, args.link_density, args.forward_rate)
+    # Configured like the client telefi.py creates, so short FloodWaits reach the rate controller
+    client = FakeTelegramClient(graph, latency=args.latency, flood_rate=args.flood_rate, flood_seconds=args.flood_seconds, flood_sleep_threshold=telefi.FLOOD_SLEEP_THRESHOLD)
+    config = {
+        'initial_channel_links': [f"https://t.me/{graph.names[0]}"],
+        'message_keywords': [],
+        'state_path': os.path.join(workdir, 'state', 'telefi.db'),
+        'entity_cache_path': os.path.join(workdir, 'state', 'entities.db'),
+        'batch_directory': os.path.join(workdir, 'batches'),
+        'output_format': args.output_format,
+        'scoring_processes': args.processes,
+        'rate_limit': {'initial_rate': args.rate, 'max_rate': args.rate, 'burst': args.rate},
+    }
+
+    configure_logging(console_level='warning', progress_interval=0)
+    start = time.perf_counter()
+    asyncio.run(telefi.run_scraper(config, args.message_depth, args.channel_depth, args.concurrency, slice_concurrency=args.history_slices, telegram_client=client))
+    crawl_seconds = time.perf_counter() - start
+    configure_logging()
+
+    crawled = metrics.messages_scraped.value()
+    stages = {}
+    for rpc in ('get_entity', 'join', 'iter_messages'):
+        count, total = metrics.rpc_latency.summary(rpc=rpc)
+        stages[f'{rpc} RPC wait'] = (count, total)
+    stages['batch flush'] = metrics.batch_flush_latency.summary()
+    scored, per_message = metrics.scoring_seconds_per_message.summary()
+
+    # Every message in the graph through a fresh BatchProcessor, then the report alone
+    rows = [
+        [message.sender_id, message.date, message.text, None, None]
+        for history in graph.messages.values() for message in history
+    ]
+    analyzer = CybersecuritySentimentAnalyzer()
+    with ScoringPool(processes=args.processes, lexicon=analyzer.cybersecurity_lexicon) as scoring_pool:
+        sink = create_batch_sink(args.output_format, os.path.join(workdir, 'batch-stage'))
+        batch_processor = BatchProcessor(batch_size=args.batch_size, cybersecurity_sia=analyzer, scoring_pool=scoring_pool, sink=sink)
+        configure_logging(console_level='warning', progress_interval=0)
+        start = time.perf_counter()
+        for position in range(0, len(rows), args.messages):
+            batch_processor.add_messages(rows[position:position + args.messages], graph.names[position // args.messages], None)
+        batch_processor.save_batch()
+        sink.close()
+        batch_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        batch_processor.generate_final_report()
+        report_seconds = time.perf_counter() - start
+        batch_processor.batch = []
+        configure_logging()
+
+    results = {
+        'crawl_messages_per_second': crawled / crawl_seconds if crawl_seconds else 0.0,
+        'batch_messages_per_second': len(rows) / batch_seconds if batch_seconds else 0.0,
+        'report_seconds': report_seconds,
+    }
+    details = {
+        'crawl_seconds': crawl_seconds,
+        'crawled': crawled,
+        'channels': metrics.channels_processed.value(),
+        'calls': client.calls,
+        'flood_waits': client.flood_waits,
+        'slept_flood_waits': client.slept_flood_waits,
+        'stages': stages,
+        'scoring_cpu_per_message_us': per_message / scored * 1e6 if scored else 0.0,
+        'batch_seconds': batch_seconds,
+        'batch_rows': len(rows),
+    }
+    return results, details
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, value in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            print_info(f"{name}: {value:.3f} (no baseline)")
+            continue
+        if name in HIGHER_IS_BETTER:
+            limit = expected * (1 - tolerance)
+            failed = value < limit
+        else:
+            limit = expected * (1 + tolerance) + NOISE_FLOOR.get(name, 0.0)
+            failed = value > limit
+        line = f"{name}: {value:.3f} (baseline {expected:.3f}, limit {limit:.3f})"
+        if failed:
+            print_error(f"REGRESSION {line}")
+            regressions.append(name)
+        else:
+            print_success(line)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Offline TeleFi benchmarks: microbenchmarks and a full crawl against a fake Telegram client')
+    parser.add_argument('--channels', type=int, default=200, help='Channels in the synthetic graph')
+    parser.add_argument('--fanout', type=int, default=4, help='Outgoing channel links per channel')
+    parser.add_argument('--messages', type=int, default=200, help='Messages per channel')
+    parser.add_argument('--link-density', type=float, default=0.05, help='Fraction of older messages that mention another channel')
+    parser.add_argument('--forward-rate', type=float, default=0.05, help='Fraction of messages that are forwards')
+    parser.add_argument('--latency', type=float, default=0.005, help='Seconds per fake RPC')
+    parser.add_argument('--flood-rate', type=float, default=0.0, help='Fraction of fake RPCs that raise FloodWaitError')
+    parser.add_argument('--flood-seconds', type=int, default=1, help='Seconds requested by each injected FloodWait')
+    parser.add_argument('--rate', type=float, default=200.0, help='Rate limiter ceiling in requests per second')
+    parser.add_argument('--message-depth', type=int, default=200, help='Messages crawled per channel')
+    parser.add_argument('--channel-depth', type=int, default=3, help='Crawl depth')
+    parser.add_argument('--concurrency', type=int, default=4, help='Channels crawled at once')
+    parser.add_argument('--history-slices', type=int, default=1, help='ID slices of one channel fetched at once (deep-history mode)')
+    parser.add_argument('--processes', type=int, default=2, help='Scoring processes')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Batch size for the BatchProcessor stage')
+    parser.add_argument('--output-format', choices=['csv', 'parquet'], default='csv', help='Batch output format')
+    parser.add_argument('--micro-size', type=int, default=20000, help='Inputs per microbenchmark')
+    parser.add_argument('--skip-micro', action='store_true', help='Skip the microbenchmarks')
+    parser.add_argument('--skip-e2e', action='store_true', help='Skip the crawl, batch and report benchmarks')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline JSON to check results against')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative slowdown before a result counts as a regression')
+    parser.add_argument('--write-baseline', action='store_true', help='Store these results as the new baseline instead of checking them')
+    args = parser.parse_args()
+
+    results = {}
+    if not args.skip_micro:
+        print_header(f"Microbenchmarks: {args.micro_size} inputs each")
+        micro = run_micro(args.micro_size)
+        for name, value in micro.items():
+            print_info(f"{name}: {value:.2f} us")
+        results.update(micro)
+
+    if not args.skip_e2e:
+        print_header(f"Crawl benchmark: {args.channels} channels, fan-out {args.fanout}, {args.messages} messages each, depth {args.channel_depth}")
+        workdir = tempfile.mkdtemp(prefix='telefi-bench-')
+        cwd = os.getcwd()
+        try:
+            # Reports are written relative to the working directory
+            os.chdir(workdir)
+            e2e, details = run_e2e(args, workdir)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+        print_info(f"Crawl: {details['crawled']} messages from {details['channels']} channels in {details['crawl_seconds']:.2f}s ({e2e['crawl_messages_per_second']:.1f} msg/s)")
+        print_info(f"Fake RPCs: {details['calls']}, {details['flood_waits']} FloodWaits injected ({details['slept_flood_waits']} slept inside the RPC)")
+        for stage, (count, total) in details['stages'].items():
+            print_info(f"  {stage}: {total:.2f}s over {count} calls")
+        print_info(f"  scoring CPU: {details['scoring_cpu_per_message_us']:.1f} us/message")
+        print_info(f"BatchProcessor: {details['batch_rows']} messages in {details['batch_seconds']:.2f}s ({e2e['batch_messages_per_second']:.1f} msg/s)")
+        print_info(f"Report generation: {e2e['report_seconds']:.3f}s")
+        rss = peak_rss_mb()
+        if rss:
+            print_info(f"Peak RSS: {rss[0]:.1f} MiB (largest scoring worker {rss[1]:.1f} MiB)")
+            e2e['peak_rss_mb'] = rss[0]
+        results.update(e2e)
+
+    if args.write_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({name: round(value, 3) for name, value in results.items()}, f, indent=2)
+            f.write('\n')
+        print_success(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print_header(f"Regression check (tolerance {args.tolerance * 100:.0f}%)")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            shutdown_logging()
+            sys.exit(1)
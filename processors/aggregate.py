@@ -0,0 +1,146 @@
+import heapq
+import itertools
+
+import numpy as np
+import pandas as pd
+
+SENTIMENT_KEYS = ['neg', 'neu', 'pos', 'compound']
+CATEGORY_ORDER = ['High Alert', 'Potential Threat', 'Neutral', 'Potentially Positive', 'Very Positive']
+
+def categorize_sentiment(compound):
+    if compound <= -0.5:
+        return 'High Alert'
+    elif -0.5 < compound <= -0.1:
+        return 'Potential Threat'
+    elif -0.1 < compound < 0.1:
+        return 'Neutral'
+    elif 0.1 <= compound < 0.5:
+        return 'Potentially Positive'
+    return 'Very Positive'
+
+# categorize_sentiment over a whole Series at once, with the same mixed open/closed bounds
+def categorize_compounds(compound):
+    values = pd.to_numeric(compound, errors='coerce').to_numpy(dtype=float)
+    codes = np.select([values <= -0.5, values <= -0.1, values < 0.1, values < 0.5], [0, 1, 2, 3], default=4)
+    return pd.Categorical.from_codes(codes, categories=CATEGORY_ORDER)
+
+# Running report state: category counts, sentiment sums, top-k heaps and a
+# (channel, affiliation) breakdown. Memory is O(top_k + channels) no matter
+# how many batches are fed in.
+class SentimentAggregator:
+    def __init__(self, top_k=5):
+        self.top_k = top_k
+        self.total_messages = 0
+        self.category_counts = {}
+        self.breakdown = None
+        self.sentiment_sums = dict.fromkeys(SENTIMENT_KEYS, 0.0)
+        self.sentiment_count = 0
+        # Threats keep the k smallest compounds, so the heap root is the largest one.
+        # Sequence numbers break ties in favour of the earliest message, like nsmallest/nlargest.
+        self.threat_heap = []
+        self.positive_heap = []
+        self.sequence = itertools.count()
+
+    def update(self, df):
+        if df.empty:
+            return
+        compound = pd.to_numeric(df['Compound'], errors='coerce')
+        self.total_messages += len(df)
+
+        # One groupby gives per-(channel, affiliation) counts per category and compound sums;
+        # channel, affiliation and overall totals are all rollups of it
+        frame = pd.get_dummies(categorize_compounds(compound), dtype='int64')
+        frame.index = df.index
+        frame['compound_sum'] = compound
+        frame['messages'] = 1
+        keys = [self._key_column(df, 'Channel Name'), self._key_column(df, 'Affiliated Channel')]
+        grouped = frame.groupby(keys, sort=False, dropna=False).sum()
+        grouped.index.names = ['channel', 'affiliation']
+        self.breakdown = grouped if self.breakdown is None else self.breakdown.add(grouped, fill_value=0)
+        for category, count in grouped[CATEGORY_ORDER].sum().items():
+            if count:
+                self.category_counts[category] = self.category_counts.get(category, 0) + int(count)
+
+        if all(key in df.columns for key in SENTIMENT_KEYS):
+            sums = df[SENTIMENT_KEYS].apply(pd.to_numeric, errors='coerce')
+            count = len(sums.dropna())
+            sums = sums.sum()
+        else:
+            sentiments = [s for s in df['Sentiment'] if isinstance(s, dict)]
+            count = len(sentiments)
+            sums = pd.DataFrame.from_records(sentiments, columns=SENTIMENT_KEYS).sum() if sentiments else None
+        if count:
+            for key in SENTIMENT_KEYS:
+                self.sentiment_sums[key] += float(sums[key])
+            self.sentiment_count += count
+
+        # Only a batch's own top-k can enter the global top-k
+        scored = pd.DataFrame({'Message': df['Message'], 'Compound': compound}).dropna(subset=['Compound'])
+        for message, value in zip(*self._columns(scored.nsmallest(self.top_k, 'Compound'))):
+            self._push(self.threat_heap, (-value, -next(self.sequence), message))
+        for message, value in zip(*self._columns(scored.nlargest(self.top_k, 'Compound'))):
+            self._push(self.positive_heap, (value, -next(self.sequence), message))
+
+    # Fold in another aggregator's state, e.g. one built in a worker process
+    def merge(self, other):
+        self.total_messages += other.total_messages
+        for category, count in other.category_counts.items():
+            self.category_counts[category] = self.category_counts.get(category, 0) + count
+        if other.breakdown is not None:
+            self.breakdown = other.breakdown if self.breakdown is None else self.breakdown.add(other.breakdown, fill_value=0)
+        for key in SENTIMENT_KEYS:
+            self.sentiment_sums[key] += other.sentiment_sums[key]
+        self.sentiment_count += other.sentiment_count
+        for heap, other_heap in ((self.threat_heap, other.threat_heap), (self.positive_heap, other.positive_heap)):
+            for value, _, message in sorted(other_heap, reverse=True):
+                self._push(heap, (value, -next(self.sequence), message))
+
+    # itertools.count cannot be pickled on every Python version; keep its position instead
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['sequence'] = next(self.sequence)
+        return state
+
+    def __setstate__(self, state):
+        state['sequence'] = itertools.count(state['sequence'])
+        self.__dict__.update(state)
+
+    def _key_column(self, df, column):
+        if column in df.columns:
+            return df[column].fillna('Unknown')
+        return pd.Series('Unknown', index=df.index)
+
+    def _columns(self, df):
+        return df['Message'].tolist(), df['Compound'].astype(float).tolist()
+
+    def _push(self, heap, item):
+        if len(heap) < self.top_k:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+
+    def average_sentiment(self):
+        if not self.sentiment_count:
+            return dict.fromkeys(SENTIMENT_KEYS, 0.0)
+        return {key: total / self.sentiment_count for key, total in self.sentiment_sums.items()}
+
+    def top_threats(self):
+        rows = sorted(self.threat_heap, reverse=True)
+        return pd.DataFrame([(message, -value) for value, _, message in rows], columns=['Message', 'Compound'])
+
+    def top_positives(self):
+        rows = sorted(self.positive_heap, reverse=True)
+        return pd.DataFrame([(message, value) for value, _, message in rows], columns=['Message', 'Compound'])
+
+    # Per channel or per affiliation (level='affiliation'), most threatening first
+    def channel_breakdown(self, level='channel'):
+        columns = ['messages', 'average_compound'] + CATEGORY_ORDER
+        if self.breakdown is None:
+            return pd.DataFrame(columns=columns)
+        rollup = self.breakdown.groupby(level=level, sort=False).sum()
+        rollup['average_compound'] = rollup['compound_sum'] / rollup['messages']
+        rollup = rollup.sort_values(['average_compound', 'messages'], ascending=[True, False])
+        return rollup[columns].astype({category: 'int64' for category in CATEGORY_ORDER + ['messages']})
+
+    def affiliation_breakdown(self):
+        return self.channel_breakdown(level='affiliation')
@@ -0,0 +1,126 @@
+import hashlib
+import re
+from collections import Counter, OrderedDict
+
+# Messages shorter than this are never treated as near-duplicates: "+1" or "dm me" are not reposts
+MIN_SIMHASH_TOKENS = 8
+SIMHASH_BITS = 64
+# Four 16-bit bands: two fingerprints within Hamming distance 3 always share one band
+SIMHASH_BANDS = 4
+BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+# Messages remembered for duplicate checks, least recently seen forgotten first
+DEDUP_MAX_ENTRIES = 100000
+
+TOKEN_PATTERN = re.compile(r'\w+')
+URL_PATTERN = re.compile(r'(?:https?://|tg://)\S+')
+
+def normalize_tokens(text):
+    return TOKEN_PATTERN.findall(URL_PATTERN.sub(' ', text.lower()))
+
+def simhash(tokens):
+    import numpy as np
+
+    # Word unigrams and bigrams as features, each weighted once
+    features = set(tokens)
+    features.update(f'{a} {b}' for a, b in zip(tokens, tokens[1:]))
+    digests = b''.join(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest() for feature in features)
+    # One row of 64 bits per feature (bit i of the little-endian hash in column i); a
+    # fingerprint bit is set where more features have it set than clear
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    majority = bits.sum(axis=0, dtype=np.int32) * 2 > len(features)
+    return int.from_bytes(np.packbits(majority, bitorder='little').tobytes(), 'little')
+
+def forward_origin(message):
+    fwd = getattr(message, 'fwd_from', None)
+    if fwd is None:
+        return None
+    peer = getattr(fwd, 'from_id', None)
+    channel_id = getattr(peer, 'channel_id', None)
+    post = getattr(fwd, 'channel_post', None)
+    if channel_id is None or post is None:
+        return None
+    return channel_id, post
+
+# Drops exact reposts (same forward origin, or the original itself) and
+# near-duplicate text (SimHash within max_distance bits), remembering which
+# stored message each dropped copy belongs to. At most max_entries messages are
+# remembered; the least recently seen or copied are forgotten first.
+class MessageDeduplicator:
+    def __init__(self, max_distance=3, max_entries=DEDUP_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        # origin -> origin of the kept message it stands for (itself when it was kept)
+        self.origins = OrderedDict()
+        self.fingerprints = {}
+        self.bands = [{} for _ in range(SIMHASH_BANDS)]
+        self.originals = {}
+        self.copies = Counter()
+        self.forward_duplicates = 0
+        self.near_duplicates = 0
+
+    def is_duplicate(self, message, chat_id, channel_name=None):
+        # A forward and the post it forwards share one identity: the original (channel, post)
+        origin = forward_origin(message) or (chat_id, message.id)
+        if origin in self.origins:
+            self.origins.move_to_end(origin)
+            self._record(self.origins[origin])
+            self.forward_duplicates += 1
+            return True
+
+        tokens = normalize_tokens(message.text)
+        if len(tokens) >= MIN_SIMHASH_TOKENS:
+            fingerprint = simhash(tokens)
+            original = self._find_near(fingerprint)
+            if original is not None:
+                self._remember(origin, original)
+                self._record(original)
+                self.near_duplicates += 1
+                return True
+            self.fingerprints[origin] = fingerprint
+            for band, buckets in enumerate(self.bands):
+                buckets.setdefault(fingerprint >> (band * BAND_BITS) & BAND_MASK, []).append((fingerprint, origin))
+
+        self._remember(origin, origin)
+        # Where the kept copy was stored, which is what dropped copies link back to
+        self.originals[origin] = (channel_name or chat_id, message.id)
+        return False
+
+    def _remember(self, origin, original):
+        self.origins[origin] = original
+        while len(self.origins) > self.max_entries:
+            self._forget(*self.origins.popitem(last=False))
+
+    def _forget(self, origin, original):
+        if origin != original:
+            return
+        self.originals.pop(origin, None)
+        self.copies.pop(origin, None)
+        fingerprint = self.fingerprints.pop(origin, None)
+        if fingerprint is None:
+            return
+        for band, buckets in enumerate(self.bands):
+            value = fingerprint >> (band * BAND_BITS) & BAND_MASK
+            bucket = buckets[value]
+            bucket.remove((fingerprint, origin))
+            if not bucket:
+                del buckets[value]
+
+    def _find_near(self, fingerprint):
+        for band, buckets in enumerate(self.bands):
+            for candidate, origin in buckets.get(fingerprint >> (band * BAND_BITS) & BAND_MASK, ()):
+                if bin(candidate ^ fingerprint).count('1') <= self.max_distance:
+                    return origin
+        return None
+
+    def _record(self, original):
+        # Copies of a kept message that has since been forgotten are not counted
+        if original in self.originals:
+            self.copies[original] += 1
+            self.origins.move_to_end(original)
+
+    def dropped(self):
+        return self.forward_duplicates + self.near_duplicates
+
+    def most_copied(self, count=5):
+        return [(self.originals[original], copies) for original, copies in self.copies.most_common(count)]
@@ -0,0 +1,105 @@
+from collections import Counter, deque
+
+from utils.logging import *
+
+KEYWORD_FILTER_MODES = ('none', 'local', 'server')
+
+# Aho-Corasick automaton over lowercased keywords: every keyword occurring
+# anywhere in a text is found in a single pass over its characters. Failure
+# links are folded into the transition table, so each character costs one
+# dict lookup.
+class KeywordMatcher:
+    def __init__(self, keywords):
+        self.keywords = sorted({keyword.lower().strip() for keyword in keywords if keyword and keyword.strip()})
+        self.transitions = [{}]
+        self.outputs = [()]
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                next_state = self.transitions[state].get(char)
+                if next_state is None:
+                    next_state = len(self.transitions)
+                    self.transitions[state][char] = next_state
+                    self.transitions.append({})
+                    self.outputs.append(())
+                state = next_state
+            self.outputs[state] = (keyword,)
+        self._build_links()
+
+    def _build_links(self):
+        children = [dict(transitions) for transitions in self.transitions]
+        fail = [0] * len(self.transitions)
+        queue = deque(children[0].values())
+        while queue:
+            state = queue.popleft()
+            # Inherit the keywords that end at the longest proper suffix
+            self.outputs[state] = self.outputs[state] + self.outputs[fail[state]]
+            for char, next_state in children[state].items():
+                fallback = fail[state]
+                while fallback and char not in children[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = children[fallback].get(char, 0) if state else 0
+                # Shallower states are complete by now, so copying the failure state's
+                # table means a miss never walks failure links at match time
+                for fail_char, fail_state in self.transitions[fail[next_state]].items():
+                    self.transitions[next_state].setdefault(fail_char, fail_state)
+                queue.append(next_state)
+
+    def find(self, text):
+        found = set()
+        if not self.keywords or not text:
+            return found
+        transitions = self.transitions
+        outputs = self.outputs
+        root = transitions[0]
+        state = 0
+        for char in text.lower():
+            state = transitions[state].get(char)
+            if state is None:
+                state = root.get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+# Keyword stage between scraping and scoring.
+#   none:   every message is kept
+#   local:  messages without a keyword are dropped after download, before scoring and storage
+#   server: keywords are sent as Telegram searches, so only matches are downloaded
+class KeywordFilter:
+    def __init__(self, keywords, mode='none'):
+        if mode not in KEYWORD_FILTER_MODES:
+            raise ValueError(f"Unknown keyword filter mode '{mode}', expected one of {', '.join(KEYWORD_FILTER_MODES)}")
+        self.mode = mode
+        self.matcher = KeywordMatcher(keywords or [])
+        # Without keywords there is nothing to filter on
+        if not self.matcher.keywords:
+            self.mode = 'none'
+        self.hits = Counter()
+        self.dropped = 0
+
+    def search_queries(self):
+        # One search per keyword in server mode; a single unfiltered pass otherwise
+        if self.mode == 'server':
+            return list(self.matcher.keywords)
+        return [None]
+
+    def record_search_hit(self, keyword):
+        self.hits[keyword] += 1
+
+    def accept(self, text):
+        if self.mode != 'local':
+            return True
+        found = self.matcher.find(text)
+        if not found:
+            self.dropped += 1
+            return False
+        self.hits.update(found)
+        return True
+
+    def display_status(self):
+        if self.mode == 'none':
+            return
+        summary = ', '.join(f"{keyword}: {self.hits[keyword]}" for keyword in self.matcher.keywords)
+        print_info(f"Keyword hits ({self.mode}): {summary}")
+        if self.mode == 'local':
+            print_info(f"Messages dropped by the keyword filter: {self.dropped}")
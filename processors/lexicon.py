@@ -0,0 +1,121 @@
+import glob
+import hashlib
+import json
+import marshal
+import mmap
+import os
+
+from utils.logging import *
+
+_PHRASE_END = None
+
+# Bump when the layout of the compiled lexicon artifact changes
+LEXICON_CACHE_FORMAT = 1
+
+def normalize_lexicon(lexicon):
+    # VADER looks tokens up lowercased, so mixed-case keys ('DDoS', 'CVE') and
+    # padded keys ('credit ') have to be folded before they can ever match
+    return {' '.join(term.lower().split()): float(score) for term, score in lexicon.items() if term.strip()}
+
+# Raw bytes of every *.json lexicon in a directory, in load order, and a hash of all of them
+def lexicon_sources(directory):
+    paths = sorted(glob.glob(os.path.join(directory, '*.json')))
+    if not paths:
+        raise FileNotFoundError(f"No lexicon files (*.json) found in '{directory}'")
+    digest = hashlib.blake2b(f"format={LEXICON_CACHE_FORMAT}".encode('utf-8'), digest_size=16)
+    sources = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest.update(f"{os.path.basename(path)}:{len(data)}:".encode('utf-8'))
+        digest.update(data)
+        sources.append((path, data))
+    return digest.hexdigest(), sources
+
+# A lexicon file is one JSON object of term: score
+def parse_lexicon_file(path, data):
+    def unique_terms(pairs):
+        terms = {}
+        for term, score in pairs:
+            if term in terms:
+                print_warning(f"Lexicon '{path}' lists '{term}' more than once, keeping the last score")
+            terms[term] = score
+        return terms
+
+    lexicon = json.loads(data, object_pairs_hook=unique_terms)
+    if not isinstance(lexicon, dict):
+        raise ValueError(f"Lexicon '{path}' must be a JSON object of term: score")
+    return lexicon
+
+# Compiled lexicons are marshal dumps read through mmap; a missing, stale-format or
+# truncated artifact just means compiling again
+def read_lexicon_cache(path):
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            artifact = marshal.loads(view)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    if not isinstance(artifact, dict) or artifact.get('format') != LEXICON_CACHE_FORMAT:
+        return None
+    return artifact
+
+def write_lexicon_cache(path, artifact):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            f.write(marshal.dumps(dict(artifact, format=LEXICON_CACHE_FORMAT)))
+        os.replace(temp_path, path)
+    except OSError as e:
+        print_debug(f"Could not write lexicon cache '{path}': {e}")
+
+# Token trie over the multi-word entries of a normalized lexicon
+class PhraseIndex:
+    def __init__(self, lexicon):
+        self.root = {}
+        self.phrase_count = 0
+        for term in lexicon:
+            tokens = term.split(' ')
+            if len(tokens) < 2:
+                continue
+            node = self.root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[_PHRASE_END] = term
+            self.phrase_count += 1
+
+    # Rebuild from a trie stored in a compiled lexicon artifact
+    @classmethod
+    def from_trie(cls, root, phrase_count):
+        index = cls({})
+        index.root = root
+        index.phrase_count = phrase_count
+        return index
+
+    def merge(self, tokens):
+        # Single greedy longest-match pass. Every matched phrase is collapsed into one
+        # token (original casing kept for VADER's ALL CAPS rule) whose lowercase form
+        # is the lexicon key; everything else passes through untouched.
+        if not self.root:
+            return tokens
+        merged = []
+        i = 0
+        n = len(tokens)
+        while i < n:
+            node = self.root.get(tokens[i].lower())
+            match_end = 0
+            j = i
+            while node is not None:
+                j += 1
+                if _PHRASE_END in node:
+                    match_end = j
+                if j >= n:
+                    break
+                node = node.get(tokens[j].lower())
+            if match_end:
+                merged.append(' '.join(tokens[i:match_end]))
+                i = match_end
+            else:
+                merged.append(tokens[i])
+                i += 1
+        return merged
@@ -0,0 +1,233 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.logging import *
+from utils import metrics
+
+# Attempts at writing a batch (or publishing pages) before the pipeline stops
+WRITE_ATTEMPTS = 3
+WRITE_RETRY_DELAY = 1.0
+
+# Raised to producers once a stage has stopped: what they put can no longer be written
+class PipelineError(Exception):
+    pass
+
+# Pushed through every stage by flush(); each stage hands on its buffered work first,
+# and the last one resolves the flush's future
+class _Flush:
+    def __init__(self, future):
+        self.future = future
+
+    def done(self):
+        # The flush may have been cancelled (Ctrl+C) while its marker was in flight
+        if not self.future.done():
+            self.future.set_result(None)
+
+# Staged message pipeline for the crawler, connected by bounded queues:
+#
+#   scrape (channel workers) -> filter (dedupe, keywords) -> score (process pool)
+#     -> batch (size or time trigger) -> write (background thread)
+#
+# Full queues make the stage before them wait, so memory stays bounded, and the
+# event loop only ever hands work off: scoring runs in the scoring pool, and
+# building, writing and aggregating a batch run on the writer thread.
+#
+# A page that fails to filter, or a batch that still fails to score or write after
+# WRITE_ATTEMPTS, stops the pipeline, and put() and flush() raise PipelineError from
+# then on, so the crawl fails instead of carrying on without its rows.
+#
+# Each page may carry its channel's progress: the (max_id, min_id) range read up to and
+# including that page, and what is left to fetch. on_progress receives {channel_id: progress}
+# once every row put before it is written (or published), so the stored progress never
+# covers unsaved messages.
+#
+# With a work_queue, filtered pages are published to it (on the writer thread)
+# instead of being scored and written here; `telefi.py worker` processes pick them up.
+class MessagePipeline:
+    def __init__(self, batch_processor, filter_messages=None, queue_size=32, write_queue_size=2, flush_interval=30.0, work_queue=None, on_progress=None):
+        self.batch_processor = batch_processor
+        self.filter_messages = filter_messages
+        self.on_progress = on_progress
+        # Progress of the channels whose pages are in the open batch
+        self.progress = {}
+        self.work_queue = work_queue
+        self.published = 0
+        self.flush_interval = flush_interval
+        self.raw_queue = asyncio.Queue(maxsize=queue_size)
+        self.score_queue = asyncio.Queue(maxsize=queue_size)
+        self.write_queue = asyncio.Queue(maxsize=write_queue_size)
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='telefi-writer')
+        self.tasks = []
+        self.failed = None
+        self.error = None
+        self.batch_started = None
+        metrics.pipeline_queue_depth.set_function(lambda: {
+            'filter': self.raw_queue.qsize(),
+            'score': self.score_queue.qsize(),
+            'write': self.write_queue.qsize(),
+        })
+
+    def start(self):
+        if not self.tasks:
+            self.failed = asyncio.get_running_loop().create_future()
+            self.tasks = [asyncio.create_task(self._filter_stage())]
+            if self.work_queue is not None:
+                self.tasks.append(asyncio.create_task(self._publish_stage()))
+            else:
+                self.tasks.append(asyncio.create_task(self._batch_stage()))
+                self.tasks.append(asyncio.create_task(self._write_stage()))
+            for task in self.tasks:
+                task.add_done_callback(self._stage_done)
+        return self
+
+    def _stage_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.error = task.exception()
+            if not self.failed.done():
+                self.failed.set_result(None)
+
+    def check(self):
+        if self.error is not None:
+            raise PipelineError(f"Message pipeline stopped: {self.error}")
+
+    # Waits for a queue operation, unless a stage stops first (the queues then never drain)
+    async def _unless_failed(self, operation):
+        waiter = asyncio.ensure_future(operation)
+        try:
+            if self.error is None:
+                await asyncio.wait({waiter, self.failed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+        self.check()
+        return waiter.result()
+
+    # Called by the scrapers with one page of raw messages (possibly empty when it only
+    # carries progress); waits while the filter stage is behind
+    async def put(self, messages, channel_id, channel_name, affiliated_channel, progress=None):
+        if messages or progress is not None:
+            self.start()
+            await self._unless_failed(self.raw_queue.put((messages, channel_id, channel_name, affiliated_channel, progress)))
+
+    async def _filter_stage(self):
+        while True:
+            item = await self.raw_queue.get()
+            if not isinstance(item, _Flush):
+                messages, channel_id, channel_name, affiliated_channel, progress = item
+                try:
+                    rows = self.filter_messages(messages, channel_id, channel_name, affiliated_channel) if self.filter_messages and messages else messages
+                except Exception as e:
+                    # Passing the page's progress on without its rows would store them as fetched
+                    raise PipelineError(f"Failed to filter messages from {channel_name}: {e}") from e
+                item = (rows, channel_name, affiliated_channel, channel_id, progress) if rows or progress is not None else None
+            if item is not None:
+                await self.score_queue.put(item)
+
+    # Starts scoring as rows arrive and cuts a batch at batch_size rows, or flush_interval
+    # seconds after its first row, whichever comes first
+    async def _batch_stage(self):
+        batch_processor = self.batch_processor
+        while True:
+            timeout = None
+            if self.batch_started is not None:
+                timeout = max(0.0, self.batch_started + self.flush_interval - time.monotonic())
+            try:
+                item = await asyncio.wait_for(self.score_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await self._cut_batch()
+                continue
+            if isinstance(item, _Flush):
+                await self._cut_batch()
+                await self.write_queue.put(item)
+                continue
+            rows, channel_name, affiliated_channel, channel_id, progress = item
+            if self.batch_started is None:
+                self.batch_started = time.monotonic()
+            if rows:
+                batch_processor.buffer_messages(rows, channel_name, affiliated_channel)
+            if progress is not None:
+                self.progress[channel_id] = progress
+            if len(batch_processor.batch) >= batch_processor.batch_size:
+                await self._cut_batch()
+
+    async def _cut_batch(self):
+        self.batch_started = None
+        progress, self.progress = self.progress, {}
+        if self.batch_processor.batch:
+            await self.write_queue.put(self.batch_processor.take_batch() + (progress,))
+        elif progress:
+            # Nothing left to write for it, but batches ahead of it may still be in flight
+            await self.write_queue.put((None, None, None, progress))
+
+    async def _write_stage(self):
+        batch_processor = self.batch_processor
+        while True:
+            item = await self.write_queue.get()
+            if isinstance(item, _Flush):
+                item.done()
+                continue
+            rows, futures, batch_number, progress = item
+            if rows is not None:
+                try:
+                    scores = await batch_processor.scoring_pool.score_futures(futures) if futures else None
+                except Exception as e:
+                    raise PipelineError(f"Failed to score batch {batch_number}: {e}") from e
+                channel_scores = await self._write(f"write batch {batch_number}", batch_processor.write_batch, rows, scores, batch_number)
+                batch_processor.finish_batch(batch_number, channel_scores)
+            self._saved(progress)
+
+    # Publishes whatever pages have piled up in one transaction, so a slow disk
+    # means fewer, larger commits rather than a longer queue
+    async def _publish_stage(self):
+        while True:
+            pages = [await self.score_queue.get()]
+            while not self.score_queue.empty() and not isinstance(pages[-1], _Flush):
+                pages.append(self.score_queue.get_nowait())
+            flush = pages.pop() if isinstance(pages[-1], _Flush) else None
+            published = [(rows, channel_name, affiliated_channel) for rows, channel_name, affiliated_channel, _, _ in pages if rows]
+            if published:
+                await self._write(f"publish {len(published)} pages to the work queue", self.work_queue.publish, published)
+                self.published += sum(len(rows) for rows, _, _ in published)
+            self._saved({channel_id: progress for _, _, _, channel_id, progress in pages if progress is not None})
+            if flush is not None:
+                flush.done()
+
+    def _saved(self, progress):
+        if progress and self.on_progress:
+            self.on_progress(progress)
+
+    # Runs a write on the writer thread, retrying with a growing delay
+    async def _write(self, description, function, *args):
+        loop = asyncio.get_running_loop()
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                return await loop.run_in_executor(self.writer, function, *args)
+            except Exception as e:
+                if attempt == WRITE_ATTEMPTS:
+                    raise PipelineError(f"Failed to {description} after {attempt} attempts: {e}") from e
+                print_warning(f"Failed to {description} (attempt {attempt}/{WRITE_ATTEMPTS}), retrying: {e}")
+                await asyncio.sleep(WRITE_RETRY_DELAY * attempt)
+
+    # Wait until everything put so far is scored, written and reported back
+    async def flush(self):
+        self.start()
+        flushed = asyncio.get_running_loop().create_future()
+        await self._unless_failed(self.raw_queue.put(_Flush(flushed)))
+        await self._unless_failed(flushed)
+
+    async def close(self):
+        if self.tasks:
+            # A stage that died would never pass the flush marker on
+            if not any(task.done() for task in self.tasks):
+                await self.flush()
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            self.tasks = []
+            if self.error is not None:
+                # Rows that never reached the sink; their progress was not stored, so
+                # the next run fetches them again
+                self.batch_processor.batch = []
+                self.batch_processor.batch_futures = []
+        self.writer.shutdown(wait=True)
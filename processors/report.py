@@ -0,0 +1,105 @@
+import os
+import time
+
+from colorama import Fore, Style
+from jinja2 import Environment, FileSystemLoader
+
+from processors.aggregate import CATEGORY_ORDER, SentimentAggregator
+from utils.logging import *
+
+TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+REPORT_TEMPLATE = 'report_template.html'
+
+CATEGORY_DESCRIPTIONS = {
+    'High Alert': 'Severe Threats',
+    'Potential Threat': 'Potential Threats',
+    'Neutral': 'Neutral Messages',
+    'Potentially Positive': 'Potentially Positive',
+    'Very Positive': 'Strong Security Indicators',
+}
+
+# Compiled on first use and reused for every report in the process
+_environment = None
+
+def get_report_template():
+    global _environment
+    if _environment is None:
+        _environment = Environment(loader=FileSystemLoader(TEMPLATE_DIRECTORY), auto_reload=False)
+    return _environment.get_template(REPORT_TEMPLATE)
+
+def breakdown_rows(breakdown):
+    return [
+        {'name': name, 'messages': int(row['messages']), 'average_compound': float(row['average_compound']), 'counts': [int(row[category]) for category in CATEGORY_ORDER]}
+        for name, row in breakdown.iterrows()
+    ]
+
+def generate_sentiment_report(df, report_directory='./reports'):
+    aggregator = SentimentAggregator()
+    aggregator.update(df)
+    return render_sentiment_report(aggregator, report_directory)
+
+def render_sentiment_report(aggregator, report_directory='./reports'):
+    try:
+        sentiment_counts = aggregator.category_counts
+        total_messages = aggregator.total_messages
+
+        # Calculate overall sentiment score
+        overall_score = aggregator.average_sentiment()['compound'] * 100
+
+        report_data = {
+            'total_messages': total_messages,
+            'overall_score': overall_score,
+            'interpretation': interpret_overall_score(overall_score),
+            'sentiment_counts': sentiment_counts,
+            'categories': list(CATEGORY_DESCRIPTIONS.items()),
+            'category_names': CATEGORY_ORDER,
+            'top_threats': aggregator.top_threats()[['Message', 'Compound']],
+            'top_positives': aggregator.top_positives()[['Message', 'Compound']],
+            'channel_rows': breakdown_rows(aggregator.channel_breakdown()),
+            'affiliation_rows': breakdown_rows(aggregator.affiliation_breakdown()),
+            'date_generated': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        }
+
+        # Stream the HTML to disk chunk by chunk instead of building it as one string
+        os.makedirs(report_directory, exist_ok=True)
+        report_filename = os.path.join(report_directory, f'report-{int(time.time())}.html')
+        with open(report_filename, 'w', encoding='utf-8') as f:
+            for chunk in get_report_template().generate(report_data):
+                f.write(chunk)
+
+        print_success(f"Sentiment analysis report generated and saved to '{report_filename}'")
+
+        # Print the sentiment category counts to the console with colors
+        print_info("Sentiment Category Counts:")
+        for category in CATEGORY_ORDER:
+            count = sentiment_counts.get(category, 0)
+            percentage = (count / total_messages) * 100
+            color = get_category_color(category)
+            print_plain(f"{color}{category}: {count} ({percentage:.1f}%){Style.RESET_ALL}")
+        return report_filename
+
+    except Exception as e:
+        print_error(f"Error generating sentiment report: {e}")
+
+# Helper function to interpret overall score
+def interpret_overall_score(score):
+    if score <= -50:
+        return "Critical situation. Numerous severe threats detected. Immediate action required."
+    elif -50 < score <= -10:
+        return "Concerning situation. Multiple potential threats identified. Heightened vigilance needed."
+    elif -10 < score < 10:
+        return "Neutral situation. No significant threats or improvements detected. Maintain standard security measures."
+    elif 10 <= score < 50:
+        return "Positive situation. Some potential security improvements identified. Consider implementing suggested measures."
+    else:
+        return "Very positive situation. Strong security indicators present. Continue current security practices and look for areas of improvement."
+
+def get_category_color(category):
+    color_map = {
+        'High Alert': Fore.RED,
+        'Potential Threat': Fore.YELLOW,
+        'Neutral': Fore.WHITE,
+        'Potentially Positive': Fore.LIGHTGREEN_EX,
+        'Very Positive': Fore.GREEN
+    }
+    return color_map.get(category, '')
@@ -0,0 +1,174 @@
+import glob
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from urllib.parse import unquote
+
+from utils.logging import *
+from utils import metrics
+from processors.aggregate import SENTIMENT_KEYS, SentimentAggregator
+from processors.report import render_sentiment_report
+from processors.scoring import _init_worker
+from processors.sia_an import compile_lexicon, get_shared_analyzer
+
+CSV_BATCH_PATTERN = 'telegram_scraped_messages_batch_*.csv'
+
+# Every stored batch file under a batch directory: the CSV batches and the parquet runs
+def find_batch_files(directory):
+    files = glob.glob(os.path.join(directory, CSV_BATCH_PATTERN))
+    files += glob.glob(os.path.join(directory, 'run=*', '**', '*.parquet'), recursive=True)
+    return sorted(files)
+
+def partition_value(path, key):
+    match = re.search(rf'(?:^|[\\/]){key}=([^\\/]+)', path)
+    return unquote(match.group(1)) if match else None
+
+def _score_texts(sia, texts):
+    return [sia.polarity_scores(text if isinstance(text, str) else '') for text in texts]
+
+def _rescore_csv(sia, path, temp_path, chunk_rows, aggregator):
+    import pandas as pd
+
+    rows = 0
+    for number, chunk in enumerate(pd.read_csv(path, chunksize=chunk_rows)):
+        scores = _score_texts(sia, chunk['Message'])
+        chunk['Sentiment'] = scores
+        chunk['Compound'] = [score['compound'] for score in scores]
+        chunk['Lexicon Version'] = sia.lexicon_version
+        chunk.to_csv(temp_path, mode='w' if number == 0 else 'a', header=number == 0, index=False)
+        aggregator.update(chunk)
+        rows += len(chunk)
+    if not os.path.exists(temp_path):
+        shutil.copyfile(path, temp_path)
+    return rows
+
+def _rescore_parquet(sia, path, temp_path, chunk_rows, aggregator):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Written by ParquetBatchSink, so the channel is only in the partition path
+    channel = partition_value(path, 'channel') or 'Unknown'
+    parquet_file = pq.ParquetFile(path)
+    writer = None
+    rows = 0
+    batches = parquet_file.iter_batches(batch_size=chunk_rows)
+    for batch in batches:
+        table = pa.Table.from_batches([batch])
+        texts = table.column('message').to_pylist()
+        scores = _score_texts(sia, texts)
+        for key in SENTIMENT_KEYS:
+            column = pa.array([score[key] for score in scores], type=pa.float32())
+            index = table.schema.get_field_index(key)
+            table = table.set_column(index, key, column) if index >= 0 else table.append_column(key, column)
+        table = table.append_column('lexicon_version', pa.array([sia.lexicon_version] * len(texts)).dictionary_encode())
+        if writer is None:
+            writer = pq.ParquetWriter(temp_path, table.schema, compression='zstd')
+        writer.write_table(table)
+
+        frame = pd.DataFrame(scores, columns=SENTIMENT_KEYS)
+        frame['Message'] = texts
+        frame['Compound'] = frame['compound']
+        frame['Channel Name'] = channel
+        if 'affiliated_channel' in table.column_names:
+            frame['Affiliated Channel'] = table.column('affiliated_channel').to_pylist()
+        aggregator.update(frame)
+        rows += len(texts)
+    if writer is None:
+        shutil.copyfile(path, temp_path)
+    else:
+        writer.close()
+    return rows
+
+# Runs in a pool worker: re-score one batch file chunk by chunk with the worker's
+# analyzer, write it under the output directory and return a partial aggregate
+def _rescore_file(path, output_path, chunk_rows):
+    sia = get_shared_analyzer()
+    started = time.process_time()
+    aggregator = SentimentAggregator()
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = f"{output_path}.tmp"
+    if path.endswith('.parquet'):
+        rows = _rescore_parquet(sia, path, temp_path, chunk_rows, aggregator)
+    else:
+        rows = _rescore_csv(sia, path, temp_path, chunk_rows, aggregator)
+    os.replace(temp_path, output_path)
+    return os.getpid(), rows, time.process_time() - started, sia.cache_info(), aggregator
+
+# Copy each parquet run's manifest next to its rescored files, stamped with the lexicon version
+def write_manifests(input_directory, output_directory, version):
+    for manifest_path in glob.glob(os.path.join(input_directory, 'run=*', '_manifest.json')):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest['lexicon_version'] = version
+        manifest['rescored'] = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        target = os.path.join(output_directory, os.path.relpath(manifest_path, input_directory))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+# Offline re-scoring of stored batches with the current lexicon. Files are spread over
+# a process pool, largest first, with at most two in flight per worker; each worker
+# streams its file in chunk_rows pieces, so memory stays flat however large the archive.
+# Output mirrors the input layout under <output_directory>/lexicon=<version>.
+def rescore_batches(input_directory='./batches', output_directory='./rescored', lexicon=None, processes=None, chunk_rows=50000, cache_size=65536, report_directory='./reports'):
+    files = find_batch_files(input_directory)
+    if not files:
+        print_warning(f"No batch files found in '{input_directory}'")
+        return None
+
+    version = compile_lexicon(lexicon)[2] if lexicon is not None else get_shared_analyzer(cache_size).lexicon_version
+    output_directory = os.path.join(output_directory, f"lexicon={version}")
+    processes = processes or multiprocessing.cpu_count()
+    files.sort(key=os.path.getsize, reverse=True)
+    print_header(f"Re-scoring {len(files)} batch files from '{input_directory}' with lexicon {version} on {processes} processes")
+
+    aggregator = SentimentAggregator()
+    worker_cache_info = {}
+    failed = []
+    total_rows = 0
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(lexicon, cache_size)) as executor:
+        remaining = iter(files)
+        pending = {}
+        while True:
+            while len(pending) < processes * 2:
+                path = next(remaining, None)
+                if path is None:
+                    break
+                output_path = os.path.join(output_directory, os.path.relpath(path, input_directory))
+                pending[executor.submit(_rescore_file, path, output_path, chunk_rows)] = path
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    pid, rows, elapsed, cache_info, partial = future.result()
+                except Exception as e:
+                    print_error(f"Failed to re-score {path}: {e}")
+                    failed.append(path)
+                    continue
+                worker_cache_info[pid] = cache_info
+                aggregator.merge(partial)
+                total_rows += rows
+                count_progress('rescored', rows)
+                if rows:
+                    metrics.scoring_seconds_per_message.observe(elapsed / rows)
+
+    write_manifests(input_directory, output_directory, version)
+    duration = time.monotonic() - started
+    hits = sum(info['hits'] for info in worker_cache_info.values())
+    lookups = hits + sum(info['misses'] for info in worker_cache_info.values())
+    print_success(f"Re-scored {total_rows} messages from {len(files) - len(failed)} files in {duration:.1f}s ({total_rows / max(duration, 1e-9):.0f} msg/s) into '{output_directory}'")
+    print_info(f"Score cache: {hits} hits over {lookups} lookups ({hits / lookups * 100 if lookups else 0.0:.1f}% hit rate)")
+    if failed:
+        print_warning(f"{len(failed)} files could not be re-scored")
+
+    if aggregator.total_messages:
+        render_sentiment_report(aggregator, report_directory)
+    return output_directory
@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from processors.sia_an import get_shared_analyzer
+from utils import metrics
+
+# Per-worker analyzer, built once by the pool initializer
+_worker_sia = None
+
+def _init_worker(lexicon, cache_size):
+    global _worker_sia
+    # Workers share the terminal's process group, so Ctrl+C reaches them too; the parent
+    # decides what to do with the chunks in flight
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_sia = get_shared_analyzer(cache_size=cache_size)
+    # Workers load the default lexicon from its compiled cache; only recompile when the
+    # parent's lexicon differs (another lexicon directory, or runtime updates)
+    if lexicon is not None and lexicon != _worker_sia.cybersecurity_lexicon:
+        _worker_sia.cybersecurity_lexicon = dict(lexicon)
+        _worker_sia._compile_lexicon()
+
+def _score_chunk(texts):
+    started = time.process_time()
+    scores = [_worker_sia.polarity_scores(text) for text in texts]
+    return os.getpid(), _worker_sia.cache_info(), time.process_time() - started, scores
+
+# Long-lived process pool for sentiment scoring. Texts are sent in chunks and
+# come back as futures, so callers on the event loop never block on scoring.
+class ScoringPool:
+    def __init__(self, processes=None, chunk_size=256, lexicon=None, cache_size=65536):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self.lexicon = lexicon
+        self.cache_size = cache_size
+        self.worker_cache_info = {}
+        self.executor = None
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=_init_worker,
+                initargs=(self.lexicon, self.cache_size),
+            )
+        return self
+
+    def submit(self, texts):
+        self.start()
+        texts = list(texts)
+        return [
+            self.executor.submit(_score_chunk, texts[i:i + self.chunk_size])
+            for i in range(0, len(texts), self.chunk_size)
+        ]
+
+    def _collect(self, results):
+        scores = []
+        for pid, cache_info, elapsed, chunk_scores in results:
+            self.worker_cache_info[pid] = cache_info
+            if chunk_scores:
+                metrics.scoring_seconds_per_message.observe(elapsed / len(chunk_scores))
+            scores.extend(chunk_scores)
+        return scores
+
+    def gather(self, futures):
+        return self._collect(future.result() for future in futures)
+
+    async def score(self, texts):
+        return await self.score_futures(self.submit(texts))
+
+    # Await futures from submit() without blocking the event loop
+    async def score_futures(self, futures):
+        return self._collect(await asyncio.gather(*(asyncio.wrap_future(future) for future in futures)))
+
+    def cache_info(self):
+        # Summed over workers, as last reported by each of them
+        totals = {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0}
+        for info in self.worker_cache_info.values():
+            for key in totals:
+                totals[key] += info[key]
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_rate'] = totals['hits'] / lookups if lookups else 0.0
+        return totals
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
@@ -1,169 +1,167 @@
-from nltk.sentiment import SentimentIntensityAnalyzer
+import hashlib
+import json
+import os
+from collections import OrderedDict
 
-class CybersecuritySentimentAnalyzer:
-    def __init__(self):
-        self.sia = SentimentIntensityAnalyzer()
-        self.sia.lexicon = {}
-        self.cybersecurity_lexicon = {
-            'vulnerability': -2.0,
-            'exploit': -3.5,
-            'patch': 2.5,
-            'hack': -3.0,
-            'h4ck': -3.0,
-            'secure': 3.5,
-            'breach': -4.0,
-            'protect': 3.0,
-            'malware': -4.0,
-            'ransomware': -4.5,
-            'ransom': -4.5,
-            'demanding': -1.0,
-            'encryption': 2.0,
-            'backdoor': -3.5,
-            'firewall': 2.5,
-            'phishing': -3.5,
-            'ph1shing': -3.5,
-            'authentication': 2.5,
-            'threat': -3.0,
-            'zero-day': -4.0,
-            '0day': -4.0,
-            'oday': -4.0,
-            'nday': -4.0,
-            'security': 2.5,
-            'attack': -3.0,
-            'defense': 3.0,
-            'compromise': -3.5,
-            'mitigation': 2.0,
-            'data-leak': -4.0,
-            'adversary': -3.0,
-            'incident': -2.5,
-            'intrusion': -3.5,
-            'DDoS': -3.0,
-            'cyberattack': -3.5,
-            'spyware': -4.0,
-            'rootkit': -4.0,
-            'whitelist': 2.0,
-            'blacklist': -2.0,
-            'vulnerability scan': 1.5,
-            'penetration test': 1.0,
-            'threat actor': -3.5,
-            'multi-factor authentication': 3.0,
-            'mfa': 3.0,
-            'spear-phishing': -4.0,
-            'security awareness': 2.5,
-            'privilege escalation': -3.5,
-            'brute force': -3.5,
-            'SQL injection': -4.0,
-            'sqli': -4.0,
-            'social engineering': -3.5,
-            'APT': -4.0,
-            'insider threat': -4.0,
-            'zero trust': 2.5,
-            'SIEM': 2.0,
-            'SOC': 2.0,
-            'incident response': 2.0,
-            'cyber hygiene': 2.0,
-            'fuzzing': 1.0,
-            'CVE': -2.0,
-            'keylogger': -4.0,
-            'XSS': -3.5,
-            'whaling': -4.0,
-            'data breach': -4.5,
-            'breached': -2.5,
-            'malicious code': -4.5,
-            'trojan': -4.0,
-            'worm': -4.0,
-            'virus': -4.0,
-            'botnet': -4.5,
-            'root access': -4.0,
-            'exfiltration': -4.5,
-            'network sniffing': -3.5,
-            'ransomware attack': -4.5,
-            'cryptojacking': -4.0,
-            'denial of service': -3.5,
-            'data poisoning': -4.0,
-            'man-in-the-middle': -4.0,
-            'DNS spoofing': -3.5,
-            'email spoofing': -3.5,
-            'SQL injection attack': -4.5,
-            'session hijacking': -4.0,
-            'cross-site scripting': -4.0,
-            'server compromise': -4.0,
-            'network attack': -4.0,
-            'encrypted': 1.5,
-            'credential stuffing': -3.5,
-            'URL phishing': -3.5,
-            'fake software update': -4.0,
-            'social engineering attack': -4.0,
-            'security vulnerability': -3.5,
-            'attack vector': -3.5,
-            'endpoint protection': 2.5,
-            'data encryption': 2.5,
-            'security policy': 2.0,
-            'security patch': 2.5,
-            'incident management': 2.0,
-            'security audit': 2.0,
-            'data integrity': 2.5,
-            'forensic analysis': 2.5,
-            'system hardening': 2.5,
-            'access control': 2.0,
-            'cybersecurity training': 2.5,
-            'vulnerability management': 2.0,
-            'penetration testing': 1.5,
-            'threat intelligence': 2.5,
-            'digital forensics': 2.5,
-            'risk assessment': 2.0,
-            'network segmentation': 2.5,
-            'patch management': 2.5,
-            'security architecture': 2.5,
-            'data masking': 2.0,
-            'secure coding': 2.0,
-            'compliance': 2.0,
-            'privacy policy': 2.0,
-            
-            # Terms related to trading/buying/selling:
-            'caller': -4.0,
-            'insider': -1.5,
-            'cb hitters': -5.0,
-            'launder': -4.0,
-            'logs': -1.5,
-            'buying': -0.5,
-            'selling': -0.5,
-            'swapper': -5.0,
-            'swapping': -5.0,
-            'credit ': -4.0,
-            'card': -1.0,
-            'sim swap': -5,
-            'swaping': -5,
-            'bank': -1,
-            'log': -1,
-            'drainer': -4,
-            'looking': -1,
-            'bank': -1,
-            'cloned': -4,
-            'tap in': -5,
-            'verizon': -4,
-            'at&t': -4,
-            'inny': -3,
-            'callers': -4,
-            'cb': -1,
-            'coinbase': -3,
-            'panel': -2,
-            'drain': -5,
-            
-            # Sensitive terms:
-            'cp': -5.0,
-            'child porn': -5.0,
-            'cheese pizza': -3.0
+from processors.lexicon import PhraseIndex, lexicon_sources, normalize_lexicon, parse_lexicon_file, read_lexicon_cache, write_lexicon_cache
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEXICON_DIRECTORY = os.path.join(REPO_DIRECTORY, 'config', 'lexicons')
+# Anchored like LEXICON_DIRECTORY, so scoring workers, benchmarks and rescore share one
+# cache whatever directory they run from
+LEXICON_CACHE_DIRECTORY = os.path.join(REPO_DIRECTORY, 'state', 'lexicons')
+
+# Normalized lexicon and phrase index of the last few lexicon versions compiled in this
+# process; lexicon updates move on to a new version, so older ones are evicted
+COMPILED_LEXICON_CACHE_SIZE = 2
+_compiled_lexicons = OrderedDict()
+_shared_analyzer = None
+
+def compile_lexicon(lexicon):
+    normalized = normalize_lexicon(lexicon)
+    version = lexicon_version(normalized)
+    compiled = _compiled_lexicons.get(version)
+    if compiled is None:
+        compiled = _compiled_lexicons[version] = (normalized, PhraseIndex(normalized), version)
+        while len(_compiled_lexicons) > COMPILED_LEXICON_CACHE_SIZE:
+            _compiled_lexicons.popitem(last=False)
+    else:
+        _compiled_lexicons.move_to_end(version)
+    return compiled
+
+# Short identifier of what a lexicon actually scores with, stamped on rescored rows
+def lexicon_version(normalized):
+    return hashlib.blake2b(json.dumps(sorted(normalized.items())).encode('utf-8'), digest_size=6).hexdigest()
+
+# Every *.json file in a lexicon directory merged in name order (later files win), with its
+# compiled form. The compiled form is cached on disk keyed by the files' content hash, so
+# an unchanged lexicon loads without parsing, normalizing or building the phrase index.
+def load_lexicon(directory=LEXICON_DIRECTORY, cache_directory=LEXICON_CACHE_DIRECTORY):
+    digest, sources = lexicon_sources(directory)
+    cache_path = os.path.join(cache_directory, f"{digest}.bin")
+    artifact = read_lexicon_cache(cache_path)
+    if artifact is None:
+        lexicon = {}
+        for path, data in sources:
+            lexicon.update(parse_lexicon_file(path, data))
+        normalized, phrase_index, version = compile_lexicon(lexicon)
+        artifact = {
+            'lexicon': lexicon,
+            'normalized': normalized,
+            'phrases': phrase_index.root,
+            'phrase_count': phrase_index.phrase_count,
+            'version': version,
         }
+        write_lexicon_cache(cache_path, artifact)
+    phrase_index = PhraseIndex.from_trie(artifact['phrases'], artifact['phrase_count'])
+    return artifact['lexicon'], (artifact['normalized'], phrase_index, artifact['version'])
+
+# VADER's scoring rules without its lexicon. SentimentIntensityAnalyzer.__init__ reads and
+# parses vader_lexicon.zip, which we would only replace, so the instance is built without it.
+def build_vader():
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+    sia = SentimentIntensityAnalyzer.__new__(SentimentIntensityAnalyzer)
+    sia.lexicon_file = None
+    sia.lexicon = {}
+    sia.constants = VaderConstants()
+    return sia
+
+# One analyzer (and score cache) per process for the crawler, batch processor and scoring workers
+def get_shared_analyzer(cache_size=65536, lexicon_directory=None, lexicon_cache_directory=None):
+    global _shared_analyzer
+    if _shared_analyzer is None:
+        _shared_analyzer = CybersecuritySentimentAnalyzer(cache_size, lexicon_directory, lexicon_cache_directory)
+    return _shared_analyzer
+
+class CybersecuritySentimentAnalyzer:
+    def __init__(self, cache_size=65536, lexicon_directory=None, lexicon_cache_directory=None):
+        self.cache_size = cache_size
+        self.score_cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+        self.sia = build_vader()
+        self.cybersecurity_lexicon, compiled = load_lexicon(lexicon_directory or LEXICON_DIRECTORY, lexicon_cache_directory or LEXICON_CACHE_DIRECTORY)
+
+        self._use_compiled(compiled)
 
-        self.sia.lexicon.update(self.cybersecurity_lexicon)
+    def _use_compiled(self, compiled):
+        self.sia.lexicon, self.phrase_index, self.lexicon_version = compiled
+        # Cached scores were computed against the old lexicon
+        self.score_cache.clear()
+
+    def _compile_lexicon(self):
+        self._use_compiled(compile_lexicon(self.cybersecurity_lexicon))
 
     def polarity_scores(self, text):
-        return self.sia.polarity_scores(text)
+        if not self.cache_size or not isinstance(text, str):
+            return self._score(text)
+
+        # VADER only ever splits on whitespace, so collapsing it keeps scores identical
+        key = hashlib.blake2b(' '.join(text.split()).encode('utf-8'), digest_size=16).digest()
+        cached = self.score_cache.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            self.score_cache.move_to_end(key)
+            return dict(cached)
+
+        self.cache_misses += 1
+        scores = self._score(text)
+        self.score_cache[key] = scores
+        if len(self.score_cache) > self.cache_size:
+            self.score_cache.popitem(last=False)
+            self.cache_evictions += 1
+        return dict(scores)
+
+    def cache_info(self):
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'evictions': self.cache_evictions,
+            'size': len(self.score_cache),
+            'max_size': self.cache_size,
+            'hit_rate': self.cache_hits / lookups if lookups else 0.0,
+        }
+
+    def _score(self, text):
+        # Same rules as SentimentIntensityAnalyzer.polarity_scores, but phrases are
+        # merged into single tokens first so multi-word entries get scored
+        from nltk.sentiment.vader import SentiText
+
+        constants = self.sia.constants
+        sentitext = SentiText(text, constants.PUNC_LIST, constants.REGEX_REMOVE_PUNCTUATION)
+        words_and_emoticons = self.phrase_index.merge(sentitext.words_and_emoticons)
+        sentitext.words_and_emoticons = words_and_emoticons
+        sentitext.is_cap_diff = sentitext.allcap_differential(words_and_emoticons)
+
+        first_index = {}
+        for idx, token in enumerate(words_and_emoticons):
+            first_index.setdefault(token, idx)
+
+        sentiments = []
+        for item in words_and_emoticons:
+            i = first_index[item]
+            item_lowercase = item.lower()
+            if (
+                i < len(words_and_emoticons) - 1
+                and item_lowercase == "kind"
+                and words_and_emoticons[i + 1].lower() == "of"
+            ) or item_lowercase in constants.BOOSTER_DICT:
+                sentiments.append(0)
+                continue
+            sentiments = self.sia.sentiment_valence(0, sentitext, item, i, sentiments)
+
+        sentiments = self.sia._but_check(words_and_emoticons, sentiments)
+        return self.sia.score_valence(sentiments, text)
 
     def get_constants(self):
         return self.sia.constants()
 
     def update_lexicon(self, word, score):
-        self.cybersecurity_lexicon[word] = score
-        self.sia.lexicon.update(self.cybersecurity_lexicon)
+        self.update_lexicon_many({word: score})
+
+    # Any number of term: score entries (a dict or pairs), compiled once
+    def update_lexicon_many(self, entries):
+        self.cybersecurity_lexicon.update(entries)
+        self._compile_lexicon()
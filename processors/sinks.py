@@ -0,0 +1,110 @@
+import json
+import os
+import time
+from urllib.parse import quote
+
+from utils.logging import *
+
+SENTIMENT_COLUMNS = ['neg', 'neu', 'pos', 'compound']
+
+# Original output: one CSV per batch, Sentiment stored as a stringified dict
+class CsvBatchSink:
+    def __init__(self, directory='./batches'):
+        self.directory = directory
+
+    def write(self, df, batch_number):
+        os.makedirs(self.directory, exist_ok=True)
+        batch_filename = os.path.join(self.directory, f"telegram_scraped_messages_batch_{batch_number}.csv")
+        df.to_csv(batch_filename, index=False)
+        return [batch_filename]
+
+    def close(self):
+        pass
+
+# Columnar output: run-scoped, hive-partitioned by channel and day
+# (<directory>/run=<id>/channel=<name>/day=<YYYY-MM-DD>/part-<batch>.parquet),
+# with sentiment split into float32 columns and a manifest listing every file.
+# The channel lives in the partition path only, not in the files.
+class ParquetBatchSink:
+    def __init__(self, directory='./batches', run_id=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow. Install it with 'pip install pyarrow' or set output_format to 'csv'.")
+        import pandas
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.pd = pandas
+        self.run_id = run_id or time.strftime('%Y%m%d-%H%M%S')
+        self.run_directory = os.path.join(directory, f"run={self.run_id}")
+        self.manifest_path = os.path.join(self.run_directory, '_manifest.json')
+        self.manifest = {
+            'run_id': self.run_id,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'format': 'parquet',
+            'partitioning': ['channel', 'day'],
+            'files': [],
+        }
+        # Manifest position of each file, so a batch written again after a failed
+        # attempt replaces its entries instead of listing them twice
+        self.file_positions = {}
+
+    def to_table(self, df):
+        pa = self.pa
+        pd = self.pd
+        sentiment = pd.DataFrame(
+            [s if isinstance(s, dict) else {} for s in df['Sentiment']],
+            columns=SENTIMENT_COLUMNS,
+            index=df.index,
+        )
+        columns = {
+            'sender_id': pa.array(pd.to_numeric(df['Sender ID'], errors='coerce').astype('Int64'), type=pa.int64()),
+            'date': pa.array(pd.to_datetime(df['Date'], utc=True, errors='coerce'), type=pa.timestamp('s', tz='UTC')),
+            'message': pa.array(df['Message'].astype(str), type=pa.string()),
+            'affiliated_channel': pa.array(df['Affiliated Channel'].astype(str)).dictionary_encode(),
+        }
+        for key in SENTIMENT_COLUMNS:
+            columns[key] = pa.array(sentiment[key].astype('float32'), type=pa.float32())
+        return pa.table(columns)
+
+    def write(self, df, batch_number):
+        written = []
+        days = self.pd.to_datetime(df['Date'], utc=True, errors='coerce').dt.strftime('%Y-%m-%d').fillna('unknown')
+        for (channel, day), group in df.groupby([df['Channel Name'].astype(str), days], sort=False):
+            partition = os.path.join(self.run_directory, f"channel={quote(channel, safe='')}", f"day={day}")
+            os.makedirs(partition, exist_ok=True)
+            path = os.path.join(partition, f"part-{batch_number:05d}.parquet")
+            self.pq.write_table(self.to_table(group), path, compression='zstd')
+            entry = {
+                'path': os.path.relpath(path, self.run_directory),
+                'channel': channel,
+                'day': day,
+                'batch': batch_number,
+                'rows': len(group),
+            }
+            if entry['path'] in self.file_positions:
+                self.manifest['files'][self.file_positions[entry['path']]] = entry
+            else:
+                self.file_positions[entry['path']] = len(self.manifest['files'])
+                self.manifest['files'].append(entry)
+            written.append(path)
+        self.write_manifest()
+        return written
+
+    def write_manifest(self):
+        os.makedirs(self.run_directory, exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def close(self):
+        self.write_manifest()
+
+def create_batch_sink(output_format='csv', directory='./batches', run_id=None):
+    if output_format == 'parquet':
+        return ParquetBatchSink(directory, run_id)
+    if output_format != 'csv':
+        print_warning(f"Unknown output_format '{output_format}', falling back to csv")
+    return CsvBatchSink(directory)
@@ -0,0 +1,68 @@
+import os
+import socket
+import time
+
+from utils.logging import *
+from utils.work_queue import WorkQueue
+from processors.batch import BatchProcessor
+from processors.scoring import ScoringPool
+from processors.sia_an import get_shared_analyzer
+from processors.sinks import create_batch_sink
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+# Analysis worker for a crawl running in queue mode: leases message pages from the
+# work queue, scores and writes them in batches of batch_size, and acknowledges the
+# pages only once their batch is on disk. Without follow, it stops when the queue is
+# empty and the crawler is no longer publishing.
+def run_worker(config, queue_path, worker_id=None, follow=False, lease_seconds=300, lease_pages=10, poll_interval=1.0, wal=True):
+    worker_id = worker_id or default_worker_id()
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds, wal=wal)
+    cache_size = config.get('score_cache_size', 65536)
+    cybersecurity_sia = get_shared_analyzer(cache_size, config.get('lexicon_directory'), config.get('lexicon_cache_directory'))
+    scoring_pool = ScoringPool(processes=config.get('scoring_processes'), lexicon=cybersecurity_sia.cybersecurity_lexicon, cache_size=cache_size).start()
+    output_format = config.get('output_format', 'csv')
+    batch_sink = create_batch_sink(output_format, config.get('batch_directory', './batches'), run_id=f"{time.strftime('%Y%m%d-%H%M%S')}-{worker_id}")
+    batch_processor = BatchProcessor(batch_size=config.get('batch_size', 1000), cybersecurity_sia=cybersecurity_sia, scoring_pool=scoring_pool, sink=batch_sink)
+    leased = []
+
+    def save():
+        if batch_processor.batch:
+            batch_processor.batch_counter = queue.next_batch_number()
+            batch_processor.save_batch()
+        queue.ack(leased, worker_id)
+        leased.clear()
+
+    print_header(f"Worker {worker_id} consuming {queue_path}")
+    try:
+        while True:
+            # A few pages at a time, saved as soon as they make a batch, so leases stay short
+            items = queue.lease(worker_id, max_items=lease_pages)
+            if not items:
+                save()
+                if not follow and not queue.producer_running() and not queue.stats()['ready']:
+                    break
+                time.sleep(poll_interval)
+                continue
+            for item_id, rows, channel_name, affiliated_channel in items:
+                batch_processor.buffer_messages(rows, channel_name, affiliated_channel)
+                leased.append(item_id)
+                count_progress('messages', len(rows))
+            if len(batch_processor.batch) >= batch_processor.batch_size:
+                save()
+    except KeyboardInterrupt:
+        print_warning("Worker interrupted")
+    finally:
+        # Pages whose batch was not written go back to the queue for the next worker
+        if leased:
+            queue.release(leased, worker_id)
+        batch_processor.batch = []
+        batch_processor.batch_futures = []
+        scoring_pool.shutdown()
+
+    stats = queue.stats()
+    print_info(f"Queue: {stats['ready']} pages ready, {stats['leased']} leased, {stats['failed']} failed after {queue.max_attempts} attempts")
+    queue.close()
+    batch_sink.close()
+    batch_processor.generate_final_report()
@@ -1,43 +1,51 @@
 import argparse
 import asyncio
+import collections
+import heapq
+import itertools
 import json
-import multiprocessing
 import os
 import random
 import re
 import signal
+import time
 from datetime import datetime
 from functools import partial
 
-import pandas as pd
-import nltk
-
-from colorama import Back, Fore, Style, init
-
-from telethon.errors import ChannelPrivateError, FloodWaitError
-from telethon.sync import TelegramClient
-from telethon.tl.functions.channels import JoinChannelRequest
-from telethon.tl.types import Channel, Chat, User
-
 from utils.logging import *
 from utils.banner import banner
 from utils.chat_util import *
-from processors.sia_an import CybersecuritySentimentAnalyzer
+from utils.rate_limit import AdaptiveRateController
+from utils.crawl_state import CrawlStateStore
+from utils.entity_cache import EntityCache
+from utils.dialog_index import DialogIndex
+from utils.work_queue import WorkQueue
+from utils import metrics
+from processors.sia_an import get_shared_analyzer
 from processors.batch import BatchProcessor
+from processors.pipeline import MessagePipeline, PipelineError
+from processors.scoring import ScoringPool
+from processors.sinks import create_batch_sink
+from processors.dedup import DEDUP_MAX_ENTRIES, MessageDeduplicator
+from processors.keywords import KEYWORD_FILTER_MODES, KeywordFilter
 
 # Global variables
-current_batch = []
-batch_counter = 1
+client = None
 
-# Ensure NLTK data is downloaded
-def ensure_nltk_data():
-    try:
-        nltk.data.find('tokenizers/punkt')
-        nltk.data.find('sentiment/vader_lexicon.zip')
-    except LookupError:
-        print_info("Downloading NLTK data...")
-        nltk.download('punkt', quiet=True)
-        nltk.download('vader_lexicon', quiet=True)
+# Messages returned by a single messages.getHistory request
+ITER_PAGE_SIZE = 100
+# Pages per ID slice in deep-history mode
+HISTORY_SLICE_PAGES = 10
+
+# FloodWaits up to this many seconds are slept inside the Telethon request that got them,
+# where neither the rate controller nor the other workers see them; 0 raises them all
+FLOOD_SLEEP_THRESHOLD = 0
+
+# FloodWaits in a row, with no message handled in between, before a channel is given up
+SCRAPE_FLOOD_RETRIES = 5
+
+# How much a source channel's average threat (0..1) adds to the priority of the links it mentions
+SOURCE_THREAT_WEIGHT = 2.0
 
 # Load configuration
 def load_config(config_path):
@@ -46,8 +54,46 @@ def load_config(config_path):
             return json.load(f)
     return None
 
+# Shared services for one crawl, handed to every channel worker
+class CrawlContext:
+    def __init__(self, client, channel_manager, batch_processor, rate_controller, message_depth, keywords, entity_cache=None, dialog_index=None, link_extractor=None, deduplicator=None, keyword_filter=None, backfill=False, pipeline=None, slice_concurrency=1):
+        self.client = client
+        self.channel_manager = channel_manager
+        self.batch_processor = batch_processor
+        self.rate_controller = rate_controller
+        self.message_depth = message_depth
+        self.keywords = keywords
+        self.entity_cache = entity_cache
+        self.dialog_index = dialog_index
+        self.link_extractor = link_extractor or LinkExtractor()
+        self.deduplicator = deduplicator
+        self.keyword_filter = keyword_filter or KeywordFilter(keywords)
+        self.backfill = backfill
+        self.pipeline = pipeline
+        self.slice_concurrency = slice_concurrency
+
+# Resolve a link to an entity, only calling get_entity on an entity cache miss
+async def resolve_entity(client, link, rate_controller, entity_cache=None):
+    cleaned_link = clean_link(link) or link
+    if entity_cache is not None:
+        entity = entity_cache.get(cleaned_link)
+        if entity is not None:
+            return entity
+    await rate_controller.acquire()
+    with metrics.rpc_latency.time(rpc='get_entity'):
+        entity = await client.get_entity(cleaned_link)
+    rate_controller.on_success()
+    if entity_cache is not None:
+        entity_cache.put(cleaned_link, entity)
+    return entity
+
 # Join channel by url
-async def join_channel(client, channel_manager, link, max_retries=3):
+async def join_channel(client, channel_manager, link, max_retries=3, rate_controller=None, entity_cache=None, dialog_index=None):
+    from telethon.errors import FloodWaitError
+    from telethon.tl.functions.channels import JoinChannelRequest
+    from telethon.tl.types import Channel, Chat, User
+
+    rate_controller = rate_controller or AdaptiveRateController()
     cleaned_link = clean_link(link)
     if not cleaned_link:
         print_warning(f"Invalid link format: {link}")
@@ -56,12 +102,21 @@ async def join_channel(client, channel_manager, link, max_retries=3):
     retries = 0
     while retries < max_retries:
         try:
-            entity = await client.get_entity(cleaned_link)
+            entity = await resolve_entity(client, cleaned_link, rate_controller, entity_cache)
             entity_name = await get_entity_name(entity)
             
             if isinstance(entity, (Channel, Chat)):
-                if entity.username:
-                    await client(JoinChannelRequest(entity))
+                if dialog_index is not None and dialog_index.is_member(entity):
+                    # Already a member from an earlier run: joining again only burns join budget
+                    dialog_index.skipped_joins += 1
+                    print_info(f"Already a member of {entity_name}, skipping join")
+                elif entity.username:
+                    await rate_controller.acquire()
+                    with metrics.rpc_latency.time(rpc='join'):
+                        await client(JoinChannelRequest(entity))
+                    rate_controller.on_success()
+                    if dialog_index is not None:
+                        dialog_index.add(entity)
                 else:
                     print_warning(f"Cannot join private channel {entity_name} without an invite link")
                     return False
@@ -76,9 +131,10 @@ async def join_channel(client, channel_manager, link, max_retries=3):
             return True
 
         except FloodWaitError as e:
-            wait_time = min(e.seconds, 30)
-            print_warning(f"FloodWaitError encountered. Waiting for {wait_time} seconds. (Attempt {retries + 1}/{max_retries})")
-            await asyncio.sleep(wait_time)
+            print_warning(f"FloodWaitError encountered. Waiting for {e.seconds} seconds. (Attempt {retries + 1}/{max_retries})")
+            rate_controller.on_flood_wait(e.seconds)
+            retries += 1
+            continue
         except Exception as e:
             print_error(f"Failed to process entity {cleaned_link}: {e}")
         
@@ -90,40 +146,160 @@ async def join_channel(client, channel_manager, link, max_retries=3):
 
 # Manage discovered channels
 class ChannelManager:
-    def __init__(self):
+    def __init__(self, state_store=None, max_channels_per_depth=None):
+        self.state_store = state_store
+        self.max_channels_per_depth = max_channels_per_depth
         self.discovered_channels = set()
         self.joined_channels = set()
         self.processed_channels = set()
         self.channel_affiliations = {}
         self.initial_channels = set()
+        self.active_channels = set()
+
+        # Priority frontier: one heap per discovery depth of (-priority, seq, link).
+        # Entries are never removed in place; stale ones are skipped when popped.
+        self.current_depth = 0
+        self.channel_depths = {}
+        self.channel_sources = {}
+        self.source_links = {}
+        self.source_scores = {}
+        self.priorities = {}
+        self.frontier = {}
+        self.depth_pending = {}
+        self.depth_started = {}
+        self.sequence = itertools.count()
+        metrics.frontier_channels.set_function(lambda: {depth + 1: pending for depth, pending in list(self.depth_pending.items())})
 
     def add_channel(self, link, source_channel=None):
         cleaned_link = clean_link(link)
-        if cleaned_link and cleaned_link not in self.joined_channels and cleaned_link not in self.processed_channels:
-            self.discovered_channels.add(cleaned_link)
+        if cleaned_link and cleaned_link not in self.joined_channels and cleaned_link not in self.processed_channels and cleaned_link not in self.active_channels:
+            # Links found while crawling depth d belong to depth d + 1; a link keeps the shallowest depth it was seen at
+            depth = self.current_depth + 1 if source_channel else 0
+            if cleaned_link in self.discovered_channels:
+                depth = min(depth, self.channel_depths[cleaned_link])
+            is_new_source = source_channel is not None and source_channel not in self.channel_sources.get(cleaned_link, ())
+            if cleaned_link in self.discovered_channels and depth == self.channel_depths[cleaned_link] and not is_new_source:
+                return
+
             if source_channel:
                 self.channel_affiliations[cleaned_link] = source_channel
+                self.channel_sources.setdefault(cleaned_link, set()).add(source_channel)
+                self.source_links.setdefault(source_channel, set()).add(cleaned_link)
             else:
                 self.initial_channels.add(cleaned_link)  # Mark as initial channel if no source
+            self.queue(cleaned_link, depth)
+            if self.state_store:
+                self.state_store.add_channel(cleaned_link, source_channel, not source_channel, depth)
+
+    def queue(self, link, depth):
+        previous_depth = self.channel_depths.get(link)
+        if link in self.discovered_channels and previous_depth != depth:
+            self.depth_pending[previous_depth] -= 1
+        if link not in self.discovered_channels or previous_depth != depth:
+            self.depth_pending[depth] = self.depth_pending.get(depth, 0) + 1
+        self.discovered_channels.add(link)
+        self.channel_depths[link] = depth
+        self.push(link)
+
+    def push(self, link):
+        priority = self.priority(link)
+        self.priorities[link] = priority
+        heapq.heappush(self.frontier.setdefault(self.channel_depths[link], []), (-priority, next(self.sequence), link))
+
+    # More distinct sources mentioning a link, and more threatening sources, crawl it sooner
+    def priority(self, link):
+        sources = self.channel_sources.get(link, ())
+        return len(sources) + SOURCE_THREAT_WEIGHT * sum(self.source_threat(source) for source in sources)
+
+    def source_threat(self, source_channel):
+        compound_sum, count = self.source_scores.get(source_channel, (0.0, 0))
+        return max(0.0, -compound_sum / count) if count else 0.0
+
+    # Links found in a channel on earlier runs. Incremental scraping does not read those
+    # messages again, so without these a later run would never get past the channel.
+    def add_known_links(self, source_channel):
+        if self.state_store:
+            for link in self.state_store.load_source_links(source_channel):
+                self.add_channel(link, source_channel=source_channel)
+
+    def record_channel_scores(self, channel_name, compound_sum, count):
+        previous_sum, previous_count = self.source_scores.get(channel_name, (0.0, 0))
+        self.source_scores[channel_name] = (previous_sum + compound_sum, previous_count + count)
+        if self.state_store:
+            self.state_store.set_source_score(channel_name, *self.source_scores[channel_name])
+        for link in self.source_links.get(channel_name, ()):
+            if link in self.discovered_channels:
+                self.push(link)
 
     def mark_as_joined(self, link):
         cleaned_link = clean_link(link)
         if cleaned_link:
             self.joined_channels.add(cleaned_link)
-            self.discovered_channels.discard(cleaned_link)
+            self.dequeue(cleaned_link)
+            if self.state_store:
+                self.state_store.mark_joined(cleaned_link)
 
     def mark_as_processed(self, link):
         cleaned_link = clean_link(link)
         if cleaned_link:
             self.processed_channels.add(cleaned_link)
-            self.discovered_channels.discard(cleaned_link)
+            metrics.channels_processed.inc()
+            self.dequeue(cleaned_link)
+            self.active_channels.discard(cleaned_link)
+            if self.state_store:
+                self.state_store.mark_processed(cleaned_link)
+
+    def dequeue(self, link):
+        if link in self.discovered_channels:
+            self.discovered_channels.discard(link)
+            self.depth_pending[self.channel_depths[link]] -= 1
+
+    # Rebuild the in-memory sets from the state store after a crash or Ctrl+C.
+    # Channels that were in flight go back on the frontier; joins are not repeated.
+    def restore(self):
+        for source_channel, compound_sum, count in self.state_store.load_source_scores():
+            self.source_scores[source_channel] = (compound_sum, count)
+        for link, source_channel in self.state_store.load_channel_sources():
+            self.channel_sources.setdefault(link, set()).add(source_channel)
+            self.source_links.setdefault(source_channel, set()).add(link)
+        for link, source_channel, is_initial, queued, joined, processed, depth in self.state_store.load_channels():
+            self.channel_depths[link] = depth
+            if source_channel:
+                self.channel_affiliations[link] = source_channel
+            if is_initial:
+                self.initial_channels.add(link)
+            if joined:
+                self.joined_channels.add(link)
+            if processed:
+                self.processed_channels.add(link)
+                self.depth_started[depth] = self.depth_started.get(depth, 0) + 1
+            elif queued:
+                self.queue(link, depth)
+
+    def is_joined(self, link):
+        return clean_link(link) in self.joined_channels
+
+    def start_depth(self, depth):
+        self.current_depth = depth
+
+    def depth_budget_left(self, depth):
+        return self.max_channels_per_depth is None or self.depth_started.get(depth, 0) < self.max_channels_per_depth
 
     def has_unprocessed_channels(self):
-        return len(self.discovered_channels) > 0
+        return self.depth_pending.get(self.current_depth, 0) > 0 and self.depth_budget_left(self.current_depth)
 
     def get_next_channel(self):
-        if self.discovered_channels:
-            return self.discovered_channels.pop()
+        depth = self.current_depth
+        heap = self.frontier.get(depth, [])
+        while heap and self.depth_budget_left(depth):
+            negative_priority, _, link = heapq.heappop(heap)
+            # Skip entries superseded by a re-push, a move to another depth, or a join/process
+            if link not in self.discovered_channels or self.channel_depths[link] != depth or self.priorities[link] != -negative_priority:
+                continue
+            self.dequeue(link)
+            self.active_channels.add(link)
+            self.depth_started[depth] = self.depth_started.get(depth, 0) + 1
+            return link
         return None
 
     def get_affiliation(self, link):
@@ -132,46 +308,41 @@ class ChannelManager:
 
     def display_status(self):
         print_subheader("Channel Status")
-        print(f"  Channels waiting to be processed: {len(self.discovered_channels)}")
-        print(f"  Channels joined: {len(self.joined_channels)}")
-        print(f"  Channels processed: {len(self.processed_channels)}")
-
-# keyboard interrupt (Ctrl+C)
-def signal_handler(sig, frame):
-    global current_batch, batch_counter
-    print_warning(f"\nKeyboard interrupt received. Saving current batch and exiting...")
-    save_current_batch(current_batch, batch_counter)
-    exit(0)
-
-# Save current batch to CSV
-def save_current_batch(batch, batch_counter):
-    if batch:
-        df = pd.DataFrame(batch, columns=['Sender ID', 'Date', 'Message', 'Sentiment', 'Compound'])
-        
-        # If sentiment analysis hasn't been done, do it now
-        if df['Sentiment'].isnull().all():
-            cybersecurity_sia = CybersecuritySentimentAnalyzer()
-            df['Sentiment'] = df['Message'].apply(cybersecurity_sia.polarity_scores)
-            df['Compound'] = df['Sentiment'].apply(lambda x: x['compound'] if isinstance(x, dict) else None)
-        
-        batch_filename = f"./batches/telegram_scraped_messages_batch_{batch_counter}.csv"
-        df.to_csv(batch_filename, index=False)
-        print_success(f"Saved batch {batch_counter} with {len(batch)} messages to {batch_filename}")
-    else:
-        print_info(f"No messages in the current batch.")
+        print_plain(f"  Channels waiting to be processed: {len(self.discovered_channels)}")
+        for depth in sorted(d for d, pending in self.depth_pending.items() if pending):
+            print_plain(f"    depth {depth + 1}: {self.depth_pending[depth]}")
+        print_plain(f"  Channels in progress: {len(self.active_channels)}")
+        print_plain(f"  Channels joined: {len(self.joined_channels)}")
+        print_plain(f"  Channels processed: {len(self.processed_channels)}")
+
+# keyboard interrupt (Ctrl+C): cancel the crawl task on the event loop, so run_scraper
+# stops scraping, drains the pipeline (writing every page already scraped) and closes
+# the crawl state itself. A second Ctrl+C exits at once.
+def install_interrupt_handler(loop, task):
+    def on_interrupt():
+        print_warning(f"\nKeyboard interrupt received. Saving scraped messages and exiting...")
+        remove_interrupt_handler(loop)
+        task.cancel()
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_interrupt)
+    except NotImplementedError:
+        # No loop signal handlers on Windows
+        signal.signal(signal.SIGINT, lambda sig, frame: loop.call_soon_threadsafe(on_interrupt))
 
-def analyze_sentiment(cybersecurity_sia, message):
-    return cybersecurity_sia.polarity_scores(message)
+def remove_interrupt_handler(loop):
+    try:
+        loop.remove_signal_handler(signal.SIGINT)
+    except NotImplementedError:
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+def process_messages(messages, scoring_pool):
+    import pandas as pd
+    from processors.report import generate_sentiment_report
 
-def process_messages(messages, num_processes=multiprocessing.cpu_count()):
     df = pd.DataFrame(messages, columns=['Sender ID', 'Date', 'Message', 'Sentiment', 'Compound'])
     
-    cybersecurity_sia = CybersecuritySentimentAnalyzer()
-    
-    # Parallelize sentiment analysis
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        partial_analyze = partial(analyze_sentiment, cybersecurity_sia)
-        df['Sentiment'] = pool.map(partial_analyze, df['Message'])
+    # Score on the long-lived pool instead of spawning one per call
+    df['Sentiment'] = scoring_pool.gather(scoring_pool.submit(df['Message']))
     
     df['Compound'] = df['Sentiment'].apply(lambda x: x['compound'])
     
@@ -179,6 +350,8 @@ def process_messages(messages, num_processes=multiprocessing.cpu_count()):
     return df
 
 async def get_entity_name(entity):
+    from telethon.tl.types import Channel, Chat, User
+
     if isinstance(entity, User):
         return f"@{entity.username}" if entity.username else f"User({entity.id})"
     elif isinstance(entity, (Channel, Chat)):
@@ -186,8 +359,212 @@ async def get_entity_name(entity):
     else:
         return f"Unknown({type(entity).__name__})"
 
-async def scrape_messages(client, entity, message_limit, keywords, channel_manager, affiliated_channel=None):
+# Which history ranges to fetch for a channel, given its stored (max_id, min_id) watermark.
+# New messages are read oldest-first from the high-water mark so the stored range stays
+# contiguous even when message_limit cuts a pass short; older history only on backfill.
+def history_passes(watermark, backfill):
+    if watermark is None:
+        return [{}]
+    max_id, min_id = watermark
+    passes = [{'min_id': max_id, 'reverse': True}]
+    if backfill:
+        passes.append({'offset_id': min_id})
+    return passes
+
+# The iter_messages requests a channel needs this crawl: one step (keyword arguments and
+# limit) per history pass of each search query (None for the plain history), given the
+# query's stored watermark. Each step moves past every message handled, so what is left
+# can be stored and a --resume run continues a channel where it stopped.
+def crawl_plan(watermarks, backfill, message_limit):
+    return [
+        dict(pass_kwargs, limit=message_limit, **({'search': search} if search is not None else {}))
+        for search, watermark in watermarks.items()
+        for pass_kwargs in history_passes(watermark, backfill)
+    ]
+
+# The step's next request starts after the handled message
+def advance_step(step, message_id):
+    if step.get('reverse'):
+        step['min_id'] = message_id
+    else:
+        step['offset_id'] = message_id
+    if step['limit'] is not None:
+        step['limit'] -= 1
+
+# Keyword filter and deduplication for one page of a channel's messages, giving batch rows
+def filter_messages(messages, channel_id, channel_name, affiliated_channel, keyword_filter, deduplicator=None):
+    rows = []
+    for message in messages:
+        if not keyword_filter.accept(message.text):
+            continue
+        if deduplicator is not None and deduplicator.is_duplicate(message, channel_id, channel_name):
+            continue
+        log_message(channel_name, message.text, affiliated_channel)
+        count_progress('messages')
+        metrics.messages_scraped.inc()
+        rows.append([message.sender_id, message.date, message.text, None, None])
+    return rows
+
+# One iter_messages stream, paced by the rate controller: iter_messages fetches
+# ITER_PAGE_SIZE messages per request, so a token is taken before every page
+async def paced_messages(client, entity, rate_controller, limit=None, **kwargs):
+    fetched = 0
+    await rate_controller.acquire()
+    page_started = time.perf_counter()
+    async for message in client.iter_messages(entity, limit=limit, wait_time=0, **kwargs):
+        yield message
+        fetched += 1
+        if fetched % ITER_PAGE_SIZE == 0:
+            metrics.rpc_latency.observe(time.perf_counter() - page_started, rpc='iter_messages')
+            rate_controller.on_success()
+            await rate_controller.acquire()
+            page_started = time.perf_counter()
+    # The last (or only) page was short of ITER_PAGE_SIZE
+    if fetched % ITER_PAGE_SIZE or not fetched:
+        metrics.rpc_latency.observe(time.perf_counter() - page_started, rpc='iter_messages')
+    rate_controller.on_success()
+
+# Deep-history mode: a pass's ID range, handed out as slices in the order the pass reads
+# messages (newest first unless reverse). min_id and max_id are both exclusive: the range
+# covers IDs low + 1 .. high - 1.
+class HistorySlices:
+    def __init__(self, low, high, reverse):
+        self.low = low
+        self.high = high
+        self.reverse = reverse
+
+    # The next slice of at most `span` IDs, or None once the range is used up
+    def next(self, span):
+        if self.high - self.low - 1 <= 0:
+            return None
+        if self.reverse:
+            start = self.low
+            self.low = min(start + span, self.high - 1)
+            return {'min_id': start, 'max_id': self.low + 1, 'reverse': True}
+        end = self.high
+        self.high = max(self.low, end - 1 - span) + 1
+        return {'min_id': self.high - 1, 'max_id': end, 'reverse': False}
+
+# The range a pass reads, down to the start of the channel (or its min_id) and up to the
+# newest message (or its offset_id). None when even message_limit IDs of it are too few
+# to be worth splitting.
+def history_slices(pass_kwargs, message_limit, top_id):
+    if 'offset_id' in pass_kwargs:
+        high = pass_kwargs['offset_id']
+    else:
+        high = top_id + 1
+    low = max(0, pass_kwargs.get('min_id', 0))
+    span = high - low - 1
+    if message_limit:
+        span = min(span, message_limit)
+    if span < 2 * ITER_PAGE_SIZE:
+        return None
+    return HistorySlices(low, high, bool(pass_kwargs.get('reverse')))
+
+# With a pipeline, every page of messages is handed to it as soon as it is read and
+# nothing is returned; without one, pages are filtered here and returned together.
+# With slice_concurrency > 1, long passes are fetched as several ID slices at once and
+# merged back in pass order.
+async def scrape_messages(client, entity, message_limit, keywords, channel_manager, affiliated_channel=None, rate_controller=None, backfill=False, link_extractor=None, deduplicator=None, keyword_filter=None, pipeline=None, slice_concurrency=1):
+    from telethon.errors import FloodWaitError
+
+    rate_controller = rate_controller or AdaptiveRateController()
+    link_extractor = link_extractor or LinkExtractor()
+    keyword_filter = keyword_filter or KeywordFilter(keywords)
+    state_store = channel_manager.state_store
     messages = []
+    page = []
+    entity_name = None
+    # (newest, oldest) message ID read per search query; each search is capped at
+    # message_limit on its own, so each gets its own watermark
+    id_ranges = {}
+    plan = None
+    emitted_progress = None
+    # Server-side keyword search runs one query per keyword; a message matching
+    # several keywords comes back from each of them but is kept once
+    seen_ids = set()
+
+    # With a pipeline, each page carries the ranges read so far and the plan left, which are
+    # stored as the channel's watermarks and plan once the page is written; the last call
+    # also covers messages read after the last page (no text, or search results already seen)
+    async def emit_page(last=False):
+        nonlocal page, emitted_progress
+        if plan is None:
+            return
+        if pipeline is not None:
+            progress = (dict(id_ranges), [dict(step) for step in plan])
+            if page or (last and progress != emitted_progress):
+                await pipeline.put(page, entity.id, entity_name, affiliated_channel, progress)
+                emitted_progress = progress
+        elif page:
+            messages.extend(filter_messages(page, entity.id, entity_name, affiliated_channel, keyword_filter, deduplicator))
+        page = []
+
+    async def handle(message, step):
+        search = step.get('search')
+        newest_id, oldest_id = id_ranges.get(search, (message.id, message.id))
+        id_ranges[search] = (max(newest_id, message.id), min(oldest_id, message.id))
+        advance_step(step, message.id)
+        if search is not None:
+            keyword_filter.record_search_hit(search)
+            if message.id in seen_ids:
+                return
+            seen_ids.add(message.id)
+        if message.text:
+            # Process Telegram links in the message text and hyperlinks; a repost still
+            # counts as its channel pointing at them, so this runs before any filtering
+            links = link_extractor.extract(message, entity_name)
+            for link in links:
+                channel_manager.add_channel(link, source_channel=entity_name)
+            page.append(message)
+            if len(page) >= ITER_PAGE_SIZE:
+                await emit_page()
+
+    async def fetch_slice(kwargs):
+        return [message async for message in paced_messages(client, entity, rate_controller, **kwargs)]
+
+    # Up to slice_concurrency slices are fetched ahead while earlier ones are handled, and a
+    # failed slice stops the pass, so what was handled stays contiguous. Slices are sized so
+    # the IDs in flight do not exceed the messages the step still needs (but span at least a
+    # page); slices that come back short (deleted messages) leave room for further ones, until
+    # the step's limit is reached or the range runs out.
+    async def scrape_slices(slices, step):
+        in_flight = collections.deque()
+        pending = 0
+
+        def schedule():
+            nonlocal pending
+            while len(in_flight) < slice_concurrency:
+                span = HISTORY_SLICE_PAGES * ITER_PAGE_SIZE
+                if step['limit'] is not None:
+                    if step['limit'] <= pending:
+                        return
+                    span = min(span, max(step['limit'] - pending, ITER_PAGE_SIZE))
+                kwargs = slices.next(span)
+                if kwargs is None:
+                    return
+                span = kwargs['max_id'] - kwargs['min_id'] - 1
+                pending += span
+                in_flight.append((asyncio.create_task(fetch_slice(kwargs)), span))
+
+        try:
+            schedule()
+            while in_flight and step['limit'] != 0:
+                task, span = in_flight.popleft()
+                sliced = await task
+                if step['limit'] is not None:
+                    sliced = sliced[:step['limit']]
+                # Until they are handled, the slice's messages count against the limit
+                pending += len(sliced) - span
+                schedule()
+                for message in sliced:
+                    await handle(message, step)
+                pending -= len(sliced)
+        finally:
+            for task, _ in in_flight:
+                task.cancel()
+            await asyncio.gather(*(task for task, _ in in_flight), return_exceptions=True)
+
     try:
         entity_name = await get_entity_name(entity)
         
@@ -195,50 +572,136 @@ async def scrape_messages(client, entity, message_limit, keywords, channel_manag
         #     print_warning(f"Skipping channel: {entity_name}")
         #     return messages, entity_name
         
-        async for message in client.iter_messages(entity, limit=message_limit):
-            if message.text:
-                if affiliated_channel:
-                    print_info(f"Message from {Fore.CYAN}{Style.BRIGHT}{entity_name}{Style.RESET_ALL}.{Fore.YELLOW}{Style.BRIGHT} <-- {affiliated_channel}{Style.RESET_ALL}: {message.text}")
-                else:
-                    print_info(f"Message from {Fore.CYAN}{Style.BRIGHT}{entity_name}{Style.RESET_ALL}: {message.text}")
-                messages.append([message.sender_id, message.date, message.text, None, None])
-                
-                # Process t.me links in the message
-                links = extract_channel_links(message.text)
-                for link in links:
-                    channel_manager.add_channel(link, source_channel=entity_name)
-            
-            await asyncio.sleep(0.1)
+        channel_manager.add_known_links(entity_name)
+        stored_plan = state_store.get_plan(entity.id) if state_store and pipeline is not None else None
+        if stored_plan is not None and stored_plan[1]:
+            # Interrupted earlier in this crawl (Ctrl+C, crash, failed write): carry on
+            plan = stored_plan[0]
+        else:
+            watermarks = {search: state_store.get_watermark(entity.id, search) if state_store else None for search in keyword_filter.search_queries()}
+            plan = crawl_plan(watermarks, backfill, message_limit)
+            if stored_plan is not None and not backfill:
+                # An earlier crawl stopped before reading the older history it meant to:
+                # new messages come first as usual, then the rest of that history
+                plan += [step for step in stored_plan[0] if not step.get('reverse') and step.get('search') in watermarks]
+        top_id = None
+        flood_retries = 0
+        flooded_step = None
+        while plan:
+            step = plan[0]
+            pass_kwargs = {key: value for key, value in step.items() if key != 'limit'}
+            try:
+                slices = None
+                if slice_concurrency > 1 and 'search' not in step:
+                    if top_id is None and 'offset_id' not in step:
+                        # The newest message ID bounds the range; an empty channel has nothing to split
+                        async for message in paced_messages(client, entity, rate_controller, limit=1):
+                            top_id = message.id
+                    if top_id is not None or 'offset_id' in step:
+                        slices = history_slices(pass_kwargs, step['limit'], top_id or 0)
+                if slices:
+                    await scrape_slices(slices, step)
+                elif step['limit'] != 0:
+                    async for message in paced_messages(client, entity, rate_controller, **step):
+                        await handle(message, step)
+            except FloodWaitError as e:
+                # Every worker waits the requested time on the rate controller, then the
+                # step goes on from the last message handled
+                flood_retries = flood_retries + 1 if step == flooded_step else 1
+                if flood_retries > SCRAPE_FLOOD_RETRIES:
+                    raise
+                flooded_step = dict(step)
+                print_warning(f"FloodWaitError in scrape_messages, resuming {entity_name} after {e.seconds} seconds")
+                rate_controller.on_flood_wait(e.seconds)
+                continue
+            plan.pop(0)
     except FloodWaitError as e:
-        print_warning(f"FloodWaitError in scrape_messages: {e}")
-        await asyncio.sleep(min(e.seconds, 30))
+        print_warning(f"FloodWaitError in scrape_messages, giving up on {entity_name}: {e}")
+        rate_controller.on_flood_wait(e.seconds)
+    except PipelineError:
+        raise
     except Exception as e:
         print_error(f"Error scraping entity {entity_name}: {e}")
+    finally:
+        # Whatever was read before an error is still kept, as its watermark covers it.
+        # Every pass reads a contiguous ID range, so a partial pass still leaves a valid watermark.
+        await emit_page(last=True)
+        # Without a pipeline the caller stores the returned messages straight away
+        if pipeline is None and state_store and id_ranges:
+            state_store.update_watermarks(entity.id, id_ranges)
     
     return messages, entity_name
 
-async def process_channels(client, channel_manager, message_depth, keywords, batch_processor):
-    while channel_manager.has_unprocessed_channels():
-        link = channel_manager.get_next_channel()
-        print_info('Joining', link)
+async def process_channel(context, link):
+    from telethon.errors import FloodWaitError
 
-        affiliated_channel = channel_manager.get_affiliation(link)
-        try:
-            join_success = await retry_with_backoff(join_channel(client, channel_manager, link))
-            if join_success:
-                entity = await client.get_entity(link)
-                entity_messages, channel_name = await scrape_messages(client, entity, message_depth, keywords, channel_manager, affiliated_channel)
-                
-                # Add messages to batch processor with channel name and affiliation
-                batch_processor.add_messages(entity_messages, channel_name, affiliated_channel)
-            else:
-                print_warning(f"Skipping entity {link} due to joining failure")
-        except Exception as e:
-            print_error(f"Failed to process entity {link}: {e}")
-        finally:
+    client = context.client
+    channel_manager = context.channel_manager
+    rate_controller = context.rate_controller
+    print_info(f"Joining {link}")
+
+    affiliated_channel = channel_manager.get_affiliation(link)
+    processed = True
+    try:
+        # Joined before a restart: the join RPC already succeeded, go straight to scraping
+        if channel_manager.is_joined(link):
+            join_success = True
+        else:
+            join_success = await retry_with_backoff(join_channel(client, channel_manager, link, rate_controller=rate_controller, entity_cache=context.entity_cache, dialog_index=context.dialog_index))
+        if join_success:
+            entity = await resolve_entity(client, link, rate_controller, context.entity_cache)
+            entity_messages, channel_name = await scrape_messages(client, entity, context.message_depth, context.keywords, channel_manager, affiliated_channel, rate_controller=rate_controller, backfill=context.backfill, link_extractor=context.link_extractor, deduplicator=context.deduplicator, keyword_filter=context.keyword_filter, pipeline=context.pipeline, slice_concurrency=context.slice_concurrency)
+            
+            # Without a pipeline, add messages to batch processor with channel name and affiliation
+            if context.pipeline is None:
+                context.batch_processor.add_messages(entity_messages, channel_name, affiliated_channel)
+        else:
+            print_warning(f"Skipping entity {link} due to joining failure")
+    except FloodWaitError as e:
+        print_warning(f"FloodWaitError while processing {link}: {e}")
+        rate_controller.on_flood_wait(e.seconds)
+    except (PipelineError, asyncio.CancelledError):
+        # The crawl stops (failed write or Ctrl+C); the rest of the channel is scraped on --resume
+        processed = False
+        raise
+    except Exception as e:
+        print_error(f"Failed to process entity {link}: {e}")
+    finally:
+        if processed:
             channel_manager.mark_as_processed(link)
-        
-        await asyncio.sleep(1)  # Small delay between processing channels
+            count_progress('channels')
+
+# Crawl discovered channels with a bounded pool of workers sharing one rate controller
+async def process_channels(context, concurrency=1):
+    channel_manager = context.channel_manager
+    work_changed = asyncio.Condition()
+    in_flight = 0
+
+    async def worker():
+        nonlocal in_flight
+        while True:
+            async with work_changed:
+                # Idle workers wait for links discovered by busy ones instead of exiting early
+                await work_changed.wait_for(lambda: channel_manager.has_unprocessed_channels() or in_flight == 0)
+                link = channel_manager.get_next_channel() if channel_manager.has_unprocessed_channels() else None
+                if link is None:
+                    return
+                in_flight += 1
+            try:
+                await process_channel(context, link)
+            finally:
+                async with work_changed:
+                    in_flight -= 1
+                    work_changed.notify_all()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        # One worker failing (pipeline stopped) stops the others too
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
 
 async def process_single_channel(client, channel_manager, link, message_depth, keywords):
     try:
@@ -256,6 +719,8 @@ async def process_single_channel(client, channel_manager, link, message_depth, k
     return []
 
 async def retry_with_backoff(coroutine, max_retries=5, base_delay=1, max_delay=60):
+    from telethon.errors import FloodWaitError
+
     retries = 0
     while True:
         try:
@@ -271,49 +736,170 @@ async def retry_with_backoff(coroutine, max_retries=5, base_delay=1, max_delay=6
             print_error(f"Unexpected error: {e}")
             raise
 
-async def run_scraper(config, message_depth, channel_depth):
-    await client.start()
+async def run_scraper(config, message_depth, channel_depth, concurrency=1, resume=False, backfill=False, max_channels_per_depth=None, keyword_filter_mode='none', slice_concurrency=None, telegram_client=None):
+    # Any object with TelegramClient's interface works here, e.g. the benchmark stand-in
+    telegram_client = telegram_client or client
+    await telegram_client.start()
     
-    signal.signal(signal.SIGINT, signal_handler)
+    loop = asyncio.get_running_loop()
+    install_interrupt_handler(loop, asyncio.current_task())
     
+    scoring_pool = None
+    batch_processor = None
+    pipeline = None
+    work_queue = None
+    state_store = None
+    entity_cache = None
+    metrics_exporter = None
     try:
-        channel_manager = ChannelManager()
-        cybersecurity_sia = CybersecuritySentimentAnalyzer()
-        batch_processor = BatchProcessor(cybersecurity_sia=cybersecurity_sia)
+        metrics_config = config.get('metrics', {})
+        if metrics_config.get('textfile') or metrics_config.get('port'):
+            metrics_exporter = metrics.MetricsExporter(
+                textfile=metrics_config.get('textfile'),
+                port=metrics_config.get('port'),
+                host=metrics_config.get('host', '127.0.0.1'),
+                interval=metrics_config.get('interval', 15),
+            ).start()
+            print_info(f"Exporting metrics to {metrics_config.get('textfile') or f'http://{metrics_exporter.host}:{metrics_exporter.port}/metrics'}")
+        state_store = CrawlStateStore(config.get('state_path', './state/telefi.db'))
+        channel_manager = ChannelManager(state_store, max_channels_per_depth=max_channels_per_depth)
+        entity_cache = EntityCache(config.get('entity_cache_path', './state/entities.db'), ttl=config.get('entity_cache_ttl', 86400))
+        rate_controller = AdaptiveRateController(**config.get('rate_limit', {}))
+        cache_size = config.get('score_cache_size', 65536)
+        cybersecurity_sia = get_shared_analyzer(cache_size, config.get('lexicon_directory'), config.get('lexicon_cache_directory'))
+        queue_config = config.get('work_queue')
+        if queue_config:
+            # Queue mode: pages are published for `telefi.py worker` processes to score and write
+            work_queue = WorkQueue(queue_config.get('path', './state/queue.db'), lease_seconds=queue_config.get('lease_seconds', 300), wal=queue_config.get('wal', True))
+            work_queue.set_producer_running(True)
+            print_info(f"Publishing scraped messages to {work_queue.path} for analysis workers")
+        else:
+            scoring_pool = ScoringPool(processes=config.get('scoring_processes'), lexicon=cybersecurity_sia.cybersecurity_lexicon, cache_size=cache_size).start()
+        batch_sink = create_batch_sink(config.get('output_format', 'csv'), config.get('batch_directory', './batches'))
+        batch_processor = BatchProcessor(
+            batch_size=config.get('batch_size', 1000),
+            cybersecurity_sia=cybersecurity_sia,
+            scoring_pool=scoring_pool,
+            sink=batch_sink,
+            # The report aggregate is saved with each batch, so a --resume run reports every batch
+            on_batch_saved=lambda batch_number: state_store.save_batch(batch_number + 1, batch_processor.aggregator),
+            on_channel_scores=channel_manager.record_channel_scores,
+        )
         
-        # Add initial channels from config
-        for link in config['initial_channel_links']:
-            channel_manager.add_channel(link)
+        depth = 0
+        if resume and state_store.get_meta('depth') is not None:
+            channel_manager.restore()
+            depth = state_store.get_meta('depth')
+            batch_processor.batch_counter = state_store.get_meta('batch_counter', 1)
+            batch_processor.aggregator = state_store.get_object('report')
+            print_info(f"Resuming crawl at depth {depth + 1} from {state_store.path}")
+        else:
+            state_store.reset()
+            # Add initial channels from config
+            for link in config['initial_channel_links']:
+                channel_manager.add_channel(link)
+        
+        deduplicator = MessageDeduplicator(max_distance=config.get('near_duplicate_distance', 3), max_entries=config.get('dedup_max_entries', DEDUP_MAX_ENTRIES))
+        keyword_filter = KeywordFilter(config['message_keywords'], keyword_filter_mode)
+        pipeline = MessagePipeline(
+            batch_processor,
+            partial(filter_messages, keyword_filter=keyword_filter, deduplicator=deduplicator),
+            queue_size=config.get('pipeline_queue_size', 32),
+            flush_interval=config.get('flush_interval', 30.0),
+            work_queue=work_queue,
+            on_progress=state_store.save_progress,
+        ).start()
+
+        dialog_index = DialogIndex()
+        await dialog_index.load(telegram_client, rate_controller, entity_cache)
+        
+        context = CrawlContext(
+            telegram_client,
+            channel_manager,
+            batch_processor,
+            rate_controller,
+            message_depth,
+            config['message_keywords'],
+            entity_cache=entity_cache,
+            dialog_index=dialog_index,
+            deduplicator=deduplicator,
+            keyword_filter=keyword_filter,
+            backfill=backfill,
+            pipeline=pipeline,
+            slice_concurrency=slice_concurrency or config.get('history_slices', 1),
+        )
         
         start_time = datetime.now()
         print_header(f"Scraping started at {start_time}")
 
-        depth = 0
-        while channel_manager.has_unprocessed_channels() and depth < channel_depth:
+        while depth < channel_depth:
+            channel_manager.start_depth(depth)
+            if not channel_manager.has_unprocessed_channels():
+                break
+            state_store.set_meta('depth', depth)
             print_subheader(f"Crawling at depth {depth + 1}/{channel_depth}")
             channel_manager.display_status()
+            rate_controller.display_status()
             
-            await process_channels(client, channel_manager, message_depth, config['message_keywords'], batch_processor)
+            await process_channels(context, concurrency=concurrency)
             
+            # Score what is left so this depth's channel threat levels rank the next depth's frontier
+            await pipeline.flush()
             depth += 1
-            
-            # Allow time for rate limiting
-            await asyncio.sleep(5)
         
         end_time = datetime.now()
         duration = end_time - start_time
         print_header(f"Scraping completed at {end_time}")
         print_info(f"Total duration: {duration}")
-        print_info(f"Total messages scraped: {batch_processor.total_messages}")
+        print_info(f"Total messages scraped: {pipeline.published if work_queue is not None else batch_processor.total_messages}")
         print_info(f"Total channels processed: {len(channel_manager.processed_channels)}")
+        rate_controller.display_status()
+        print_info(f"Entity cache: {entity_cache.hits} hits, {entity_cache.misses} misses")
+        print_info(f"Joins skipped for existing memberships: {dialog_index.skipped_joins}")
+        print_info(f"Duplicates dropped: {deduplicator.forward_duplicates} forwards, {deduplicator.near_duplicates} near-duplicates")
+        for (channel_name, message_id), copies in deduplicator.most_copied():
+            print_info(f"  {channel_name} message {message_id}: {copies} copies dropped")
+        keyword_filter.display_status()
 
-        # Finalize batch processing and generate report
-        batch_processor.finalize()
+        await pipeline.close()
+        if work_queue is not None:
+            # Scoring, batches and the report are left to the workers
+            stats = work_queue.stats()
+            print_info(f"Work queue: {stats['ready'] + stats['leased']} pages ({stats['messages']} messages) waiting for workers")
+        else:
+            # Finalize batch processing and generate report
+            batch_processor.finalize()
+
+            cache_info = scoring_pool.cache_info()
+            print_info(f"Score cache: {cache_info['hits']} hits, {cache_info['misses']} misses, {cache_info['evictions']} evictions ({cache_info['hit_rate'] * 100:.1f}% hit rate)")
 
+    except asyncio.CancelledError:
+        # Ctrl+C: the pipeline is drained below; the report covering the batches written so
+        # far is saved with them and rendered by the --resume run
+        if pipeline is not None:
+            await pipeline.close()
+        if batch_processor is not None:
+            batch_processor.sink.close()
+        if state_store is not None:
+            print_info("Crawl state saved. Run again with --resume to continue.")
     except Exception as e:
         print_error(f"An error occurred during scraping: {e}")
     finally:
-        await client.disconnect()
+        remove_interrupt_handler(loop)
+        if pipeline is not None:
+            await pipeline.close()
+        if metrics_exporter is not None:
+            metrics_exporter.stop()
+        if scoring_pool is not None:
+            scoring_pool.shutdown()
+        if work_queue is not None:
+            work_queue.set_producer_running(False)
+            work_queue.close()
+        if state_store is not None:
+            state_store.close()
+        if entity_cache is not None:
+            entity_cache.close()
+        await telegram_client.disconnect()
 
 async def process_all_channels(client, channel_manager, message_depth, keywords):
     all_messages = []
@@ -359,18 +945,81 @@ async def process_discovered_channels(client, channel_manager, message_depth, ke
 
 if __name__ == "__main__":
     banner()
-    ensure_nltk_data()
 
     parser = argparse.ArgumentParser(description='Telegram Content Crawler')
+    parser.add_argument('command', nargs='?', choices=['crawl', 'rescore', 'worker'], default='crawl', help='crawl Telegram (default), rescore the stored batches offline with the current lexicon, or run an analysis worker on a work queue')
     parser.add_argument('--config', type=str, default='./config/config.json', help='Path to the configuration file')
     parser.add_argument('--message-depth', type=int, default=40, help='Number of messages to crawl per channel')
     parser.add_argument('--channel-depth', type=int, default=2, help='Depth of channel crawling')
+    parser.add_argument('--resume', action='store_true', help='Resume the previous crawl from the saved crawl state')
+    parser.add_argument('--backfill', action='store_true', help='Also fetch history older than the oldest message stored for each channel')
+    parser.add_argument('--max-channels-per-depth', type=int, default=None, help='Crawl at most this many channels at each depth, highest priority first')
+    parser.add_argument('--keyword-filter', choices=KEYWORD_FILTER_MODES, default=None, help='Filter messages on message_keywords: none, local (drop non-matching messages before scoring) or server (Telegram-side search) (overrides config keyword_filter)')
+    parser.add_argument('--log-file', type=str, default=None, help='JSON-lines log file (overrides config log_path, default ./logs/telefi.jsonl)')
+    parser.add_argument('--log-level', choices=['debug', 'info', 'warning', 'error'], default=None, help='Minimum level written to the log file; debug also logs every message (overrides config log_level)')
+    parser.add_argument('--echo-messages', action='store_true', help='Print every scraped message to the console')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on http://127.0.0.1:<port>/metrics')
+    parser.add_argument('--metrics-file', type=str, default=None, help='Write Prometheus metrics to this text file (node_exporter textfile collector)')
+    parser.add_argument('--concurrency', type=int, default=None, help='Number of channels to crawl at once (overrides config crawl_concurrency)')
+    parser.add_argument('--history-slices', type=int, default=None, help='Deep-history mode: fetch up to this many ID slices of one channel\'s history at once (overrides config history_slices, default 1)')
+    parser.add_argument('--input', type=str, default=None, help='rescore: batch directory to read (overrides config batch_directory)')
+    parser.add_argument('--output', type=str, default='./rescored', help='rescore: directory for the re-scored batches')
+    parser.add_argument('--processes', type=int, default=None, help='rescore: worker processes (overrides config scoring_processes, default all cores)')
+    parser.add_argument('--chunk-rows', type=int, default=50000, help='rescore: rows read and scored at a time per file')
+    parser.add_argument('--queue', type=str, default=None, help='crawl: publish scraped messages to this work queue instead of scoring them; worker: the queue to consume (overrides config work_queue.path)')
+    parser.add_argument('--worker-id', type=str, default=None, help='worker: name used for leases (default <hostname>-<pid>)')
+    parser.add_argument('--follow', action='store_true', help='worker: keep waiting for work after the crawler stops')
     args = parser.parse_args()
 
     config = load_config(args.config)
+    if config is None and args.command in ('rescore', 'worker'):
+        config = {}
     if config is None:
         exit(f"Config file '{args.config}' not found. Please rename '[/config/config.json.example] to [config.json] and enter correct details.")
 
+    if args.metrics_port or args.metrics_file:
+        config.setdefault('metrics', {})
+        if args.metrics_port:
+            config['metrics']['port'] = args.metrics_port
+        if args.metrics_file:
+            config['metrics']['textfile'] = args.metrics_file
+
+    configure_logging(
+        log_path=args.log_file or config.get('log_path', './logs/telefi.jsonl'),
+        file_level=args.log_level or config.get('log_level', 'info'),
+        echo_messages=args.echo_messages or config.get('echo_messages', False),
+    )
+
+    # Offline: works on stored batches only and never connects to Telegram
+    if args.command == 'rescore':
+        from processors.rescore import rescore_batches
+        cache_size = config.get('score_cache_size', 65536)
+        rescore_batches(
+            input_directory=args.input or config.get('batch_directory', './batches'),
+            output_directory=args.output,
+            lexicon=get_shared_analyzer(cache_size, config.get('lexicon_directory'), config.get('lexicon_cache_directory')).cybersecurity_lexicon,
+            processes=args.processes or config.get('scoring_processes'),
+            chunk_rows=args.chunk_rows,
+            cache_size=cache_size,
+        )
+        exit()
+
+    if args.queue:
+        config['work_queue'] = dict(config.get('work_queue') or {}, path=args.queue)
+
+    # Analysis tier for a crawl running in queue mode; never connects to Telegram either
+    if args.command == 'worker':
+        from processors.worker import run_worker
+        queue_config = config.get('work_queue') or {}
+        run_worker(
+            config,
+            queue_config.get('path', './state/queue.db'),
+            worker_id=args.worker_id,
+            follow=args.follow,
+            lease_seconds=queue_config.get('lease_seconds', 300),
+            wal=queue_config.get('wal', True),
+        )
+        exit()
 
     account = config.get('account')
     API_ID = account.get('api_id')
@@ -380,7 +1029,12 @@ if __name__ == "__main__":
     if not API_ID or not API_HASH or not PHONE_NUMBER:
         exit("API credentials are missing. Please provide them either as command-line arguments or in the script. (Line 664-666)")
 
-    client = TelegramClient('TeleFi', API_ID, API_HASH)
+    # telethon is only imported by the crawl code that uses it, so rescore and worker start without it
+    from telethon.sync import TelegramClient
+    client = TelegramClient('TeleFi', API_ID, API_HASH, flood_sleep_threshold=FLOOD_SLEEP_THRESHOLD)
 
     with client:
-        client.loop.run_until_complete(run_scraper(config, args.message_depth, args.channel_depth))
+        concurrency = args.concurrency or config.get('crawl_concurrency', 4)
+        max_channels_per_depth = args.max_channels_per_depth or config.get('max_channels_per_depth')
+        keyword_filter_mode = args.keyword_filter or config.get('keyword_filter', 'none')
+        client.loop.run_until_complete(run_scraper(config, args.message_depth, args.channel_depth, concurrency, args.resume, args.backfill, max_channels_per_depth, keyword_filter_mode, args.history_slices))
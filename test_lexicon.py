@@ -1,4 +1,3 @@
-import nltk
 import time
 from processors.sia_an import CybersecuritySentimentAnalyzer
 from rich import print
@@ -8,8 +7,6 @@ from rich.progress import track
 
 from utils.logging import *
 
-nltk.download('vader_lexicon')
-
 tests = [
     "The vulnerability in the firewall allowed a hacker to breach the system.",
     "Applying a patch improved the system's.",
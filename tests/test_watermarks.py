@@ -0,0 +1,147 @@
+import asyncio
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import pandas as pd
+
+import telefi
+from benchmarks.fake_telegram import FakeChannelGraph, FakeTelegramClient
+from processors import pipeline
+from processors.sinks import CsvBatchSink
+from utils.crawl_state import CrawlStateStore
+from utils.logging import *
+
+# Cancels the crawl task once `cancel_after` iter_messages pages have been served,
+# as Ctrl+C does through the interrupt handler
+class CancellingClient(FakeTelegramClient):
+    def __init__(self, graph, cancel_after=None, **kwargs):
+        super().__init__(graph, **kwargs)
+        self.cancel_after = cancel_after
+        self.task = None
+
+    async def _rpc(self, name):
+        await super()._rpc(name)
+        if name == 'iter_messages' and self.calls[name] == self.cancel_after:
+            self.task.cancel()
+
+# Writes the first batch, then fails every write like a full disk
+class FailingSink(CsvBatchSink):
+    def write(self, df, batch_number):
+        if batch_number > 1:
+            raise OSError("No space left on device")
+        return super().write(df, batch_number)
+
+# Watermarks and plans against the fake client: whatever stops a crawl, the next run
+# (--resume or a fresh one) stores every message once
+class WatermarkTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp(prefix='telefi-test-')
+        # Reports are written relative to the working directory
+        os.chdir(self.workdir)
+        configure_logging(console_level='error', progress_interval=0)
+        patcher = mock.patch.object(pipeline, 'WRITE_RETRY_DELAY', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        configure_logging()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def config(self, batch_directory='batches', state_path='state/telefi.db', keywords=()):
+        return {
+            'initial_channel_links': ['https://t.me/chan00000'],
+            'message_keywords': list(keywords),
+            'state_path': state_path,
+            'entity_cache_path': 'state/entities.db',
+            'batch_directory': batch_directory,
+            'batch_size': 100,
+            'scoring_processes': 1,
+            'rate_limit': {'initial_rate': 1000, 'max_rate': 1000, 'burst': 1000},
+        }
+
+    def crawl(self, client, config, message_depth, channel_depth=1, **kwargs):
+        async def run():
+            client.task = asyncio.current_task()
+            await telefi.run_scraper(config, message_depth, channel_depth, 1, telegram_client=client, **kwargs)
+        asyncio.run(run())
+
+    def stored(self, *directories):
+        files = [path for directory in directories for path in glob.glob(os.path.join(directory, '*.csv'))]
+        return pd.concat([pd.read_csv(path) for path in files], ignore_index=True)
+
+    def test_cancel_mid_channel_then_resume(self):
+        graph = FakeChannelGraph(channels=1, fanout=1, messages=1000, forward_rate=0)
+        config = self.config()
+
+        self.crawl(CancellingClient(graph, cancel_after=3, latency=0.01), config, 1000)
+        store = CrawlStateStore(config['state_path'])
+        try:
+            self.assertEqual([row[5] for row in store.load_channels()], [0])
+            plan, current = store.get_plan(graph.entity('chan00000').id)
+            self.assertTrue(current)
+            self.assertTrue(plan)
+        finally:
+            store.close()
+
+        client = CancellingClient(graph, latency=0)
+        self.crawl(client, config, 1000, resume=True)
+        self.assertGreater(client.calls['iter_messages'], 0)
+        stored = self.stored('batches')
+        self.assertEqual(len(stored), 1000)
+        self.assertEqual(stored['Message'].nunique(), 1000)
+        # The report of the resumed run covers the batches written before the interrupt
+        [report] = glob.glob('reports/*.html')
+        with open(report, encoding='utf-8') as f:
+            self.assertIn('Total Messages Analyzed:</strong> 1000', f.read())
+
+    def test_failing_sink_then_incremental_run(self):
+        graph = FakeChannelGraph(channels=3, fanout=2, messages=500, forward_rate=0)
+        self.crawl(FakeTelegramClient(graph, latency=0), self.config('clean', 'state/clean.db'), 500, channel_depth=2)
+        expected = self.stored('clean')
+
+        with mock.patch.object(telefi, 'create_batch_sink', lambda output_format, directory: FailingSink(directory)):
+            self.crawl(FakeTelegramClient(graph, latency=0), self.config('failed'), 500, channel_depth=2)
+        self.crawl(FakeTelegramClient(graph, latency=0), self.config('incremental'), 500, channel_depth=2)
+        stored = self.stored('failed', 'incremental')
+
+        self.assertFalse(stored.duplicated(['Channel Name', 'Message']).any())
+        self.assertEqual(
+            sorted(zip(stored['Channel Name'], stored['Message'])),
+            sorted(zip(expected['Channel Name'], expected['Message'])),
+        )
+
+    def test_search_watermarks_per_keyword(self):
+        graph = FakeChannelGraph(channels=1, fanout=1, messages=600, forward_rate=0)
+        keywords = ['carding', 'botnet']
+        history = graph.messages['chan00000'][::-1]
+        hits = {keyword: [message for message in history if keyword in message.text.lower()] for keyword in keywords}
+        config = self.config(keywords=keywords)
+
+        self.crawl(FakeTelegramClient(graph, latency=0), dict(config, batch_directory='first'), 30, keyword_filter_mode='server')
+        store = CrawlStateStore(config['state_path'])
+        try:
+            channel_id = graph.entity('chan00000').id
+            for keyword in keywords:
+                self.assertEqual(tuple(store.get_watermark(channel_id, keyword)), (hits[keyword][0].id, hits[keyword][29].id))
+            # Searches leave the plain history watermark alone
+            self.assertIsNone(store.get_watermark(channel_id))
+        finally:
+            store.close()
+
+        self.crawl(FakeTelegramClient(graph, latency=0), dict(config, batch_directory='backfill'), 30, keyword_filter_mode='server', backfill=True)
+        stored = self.stored('first', 'backfill')
+        expected = {message.text for keyword in keywords for message in hits[keyword][:60]}
+        self.assertEqual(set(stored['Message']), expected)
+
+if __name__ == '__main__':
+    unittest.main()
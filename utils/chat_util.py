@@ -1,27 +1,100 @@
-from re import findall, match as re_match, search
+from re import compile as re_compile, VERBOSE
+
+from utils.bloom import BloomFilter
+
+# Every Telegram link form in one pattern: t.me / telegram.me / telegram.dog
+# (public usernames, t.me/s/ previews, joinchat/ and + invites) and tg:// deep links.
+# Each branch starts with a literal and the optional https://www. prefix is left out
+# of the match, which keeps the scan close to a plain substring search. The host is
+# then checked by looking back: it must not follow a word character, dot or dash
+# (other than a leading www.), so robot.me/... or foot.me/... are not t.me links.
+LINK_PATTERN = re_compile(r'''
+    (?:[tT]|[tT]elegram)\.
+    (?:
+        (?<![\w.-][tT]\.)(?<![\w.-][tT]elegram\.)
+      | (?<=(?<![\w.-])[wW]{3}\.[tT]\.)
+      | (?<=(?<![\w.-])[wW]{3}\.[tT]elegram\.)
+    )
+    (?:[mM][eE]|dog)/
+    (?:
+        (?:joinchat/|\+)(?P<invite>[A-Za-z0-9_-]+)
+      | (?:s/)?(?P<username>[A-Za-z][A-Za-z0-9_]{3,31})(?![A-Za-z0-9_])
+    )
+  | tg://
+    (?:
+        resolve\?domain=(?P<domain>[A-Za-z][A-Za-z0-9_]{3,31})(?![A-Za-z0-9_])
+      | join\?invite=(?P<tg_invite>[A-Za-z0-9_-]+)
+    )
+''', VERBOSE)
+
+BARE_USERNAME_PATTERN = re_compile(r'[a-zA-Z0-9_]{5,}')
+INVITE_PREFIX = 'https://t.me/joinchat/'
+
+# t.me paths that look like usernames but are Telegram features
+RESERVED_PATHS = frozenset({
+    'joinchat', 'addstickers', 'addemoji', 'addtheme', 'addlist', 'share', 'proxy',
+    'socks', 'login', 'setlanguage', 'confirmphone', 'invoice', 'boost', 'iv',
+})
+
+def canonical_link(match):
+    invite = match.group('invite') or match.group('tg_invite')
+    if invite:
+        # t.me/+<digits> is a phone number link, not an invite
+        if invite.isdigit() and match.group(0).endswith(f'+{invite}'):
+            return None
+        return f'{INVITE_PREFIX}{invite}'
+    username = (match.group('username') or match.group('domain')).lower()
+    if username in RESERVED_PATHS:
+        return None
+    return username
 
 def extract_channel_links(text):
     if not text or not isinstance(text, str):
         return []
-    pattern = r't\.me/(?:joinchat/)?[a-zA-Z0-9_-]+'
-    return findall(pattern, text)
+    links = []
+    for match in LINK_PATTERN.finditer(text):
+        link = canonical_link(match)
+        if link:
+            links.append(link)
+    return links
 
 def clean_link(link):
     if not link or not isinstance(link, str):
         return None
-    
+
     link = link.split(')')[0].strip()
-    
-    if re_match(r'^[a-zA-Z0-9_]{5,}$', link):
+
+    if BARE_USERNAME_PATTERN.fullmatch(link):
+        return link.lower()
+
+    if link.startswith(INVITE_PREFIX):
         return link
-    
-    match_obj = search(r't\.me/(?:joinchat/)?([a-zA-Z0-9_-]+)', link)
+
+    match_obj = LINK_PATTERN.search(link)
     if match_obj:
-        username_or_hash = match_obj.group(1)
-        
-        if 'joinchat' in link:
-            return f'https://t.me/joinchat/{username_or_hash}'
-        
-        return username_or_hash
-    
+        return canonical_link(match_obj)
+
     return None
+
+# Canonical links from a message's text and hidden hyperlinks (MessageEntityTextUrl),
+# deduplicated per source channel with a Bloom filter before they reach ChannelManager
+class LinkExtractor:
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        self.seen = BloomFilter(capacity, error_rate)
+        self.duplicates = 0
+
+    def extract(self, message, source_channel=None):
+        links = extract_channel_links(getattr(message, 'text', None))
+        for entity in getattr(message, 'entities', None) or ():
+            url = getattr(entity, 'url', None)
+            if url:
+                links.extend(extract_channel_links(url))
+
+        new_links = []
+        for link in links:
+            # Keyed per source so repeated mentions still count once for each distinct source
+            if self.seen.add(f'{source_channel}\x00{link}'):
+                new_links.append(link)
+            else:
+                self.duplicates += 1
+        return new_links
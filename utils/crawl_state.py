@@ -0,0 +1,264 @@
+import json
+import os
+import pickle
+import sqlite3
+import time
+
+SCHEMA_VERSION = 2
+
+# Durable crawl state (frontier, joins, progress) in a WAL-mode SQLite database.
+# Every state change is its own transaction, so a crash loses at most the
+# change that was in flight.
+class CrawlStateStore:
+    def __init__(self, path='./state/telefi.db'):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.create_schema()
+
+    def create_schema(self):
+        with self.transaction():
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS channels (
+                    link TEXT PRIMARY KEY,
+                    source_channel TEXT,
+                    is_initial INTEGER NOT NULL DEFAULT 0,
+                    queued INTEGER NOT NULL DEFAULT 0,
+                    joined INTEGER NOT NULL DEFAULT 0,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    depth INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS channel_sources (
+                    link TEXT NOT NULL,
+                    source_channel TEXT NOT NULL,
+                    PRIMARY KEY (link, source_channel)
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS source_scores (
+                    source_channel TEXT PRIMARY KEY,
+                    compound_sum REAL NOT NULL,
+                    message_count INTEGER NOT NULL
+                )
+            """)
+            # Highest/lowest stored message ID per channel; kept across runs and never reset
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS channel_watermarks (
+                    channel_id INTEGER PRIMARY KEY,
+                    max_id INTEGER NOT NULL,
+                    min_id INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # The same per channel and keyword for server-side searches: each search is capped
+            # at the message limit on its own, so their ranges cannot be merged
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_watermarks (
+                    channel_id INTEGER NOT NULL,
+                    query TEXT NOT NULL,
+                    max_id INTEGER NOT NULL,
+                    min_id INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (channel_id, query)
+                )
+            """)
+            # What is left to fetch from each channel (see telefi.crawl_plan), so a --resume run
+            # continues a channel that was interrupted half way. Plans left unfinished by an
+            # earlier crawl are kept with current = 0 for the next crawl of the channel.
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS channel_plans (
+                    channel_id INTEGER PRIMARY KEY,
+                    plan TEXT NOT NULL,
+                    current INTEGER NOT NULL DEFAULT 1
+                )
+            """)
+            # Pickled crawl-scoped objects, e.g. the report aggregate of the batches written so far
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS crawl_objects (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS crawl_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(channels)")}
+            if version < 2 and 'depth' not in columns:
+                self.conn.execute("ALTER TABLE channels ADD COLUMN depth INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def transaction(self):
+        return _Transaction(self.conn)
+
+    # A fresh crawl clears the previous crawl's progress but keeps the link graph (known
+    # channels and where they were found), which incremental runs cannot rediscover, and
+    # the plans of channels the previous crawl did not finish
+    def reset(self):
+        with self.transaction():
+            self.conn.execute("UPDATE channels SET is_initial = 0, queued = 0, joined = 0, processed = 0")
+            self.conn.execute("DELETE FROM source_scores")
+            self.conn.execute("DELETE FROM channel_plans WHERE plan = '[]'")
+            self.conn.execute("UPDATE channel_plans SET current = 0")
+            self.conn.execute("DELETE FROM crawl_objects")
+            self.conn.execute("DELETE FROM crawl_meta")
+
+    def add_channel(self, link, source_channel, is_initial, depth=0):
+        with self.transaction():
+            self.conn.execute(
+                """INSERT INTO channels (link, source_channel, is_initial, queued, updated_at, depth)
+                   VALUES (?, ?, ?, 1, ?, ?)
+                   ON CONFLICT(link) DO UPDATE SET
+                       source_channel = COALESCE(excluded.source_channel, channels.source_channel),
+                       is_initial = MAX(channels.is_initial, excluded.is_initial),
+                       queued = 1,
+                       updated_at = excluded.updated_at,
+                       depth = excluded.depth""",
+                (link, source_channel, int(is_initial), time.time(), depth),
+            )
+            if source_channel:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO channel_sources (link, source_channel) VALUES (?, ?)",
+                    (link, source_channel),
+                )
+
+    def mark_joined(self, link):
+        with self.transaction():
+            self.conn.execute(
+                """INSERT INTO channels (link, joined, updated_at) VALUES (?, 1, ?)
+                   ON CONFLICT(link) DO UPDATE SET joined = 1, updated_at = excluded.updated_at""",
+                (link, time.time()),
+            )
+
+    def mark_processed(self, link):
+        with self.transaction():
+            self.conn.execute(
+                """INSERT INTO channels (link, processed, updated_at) VALUES (?, 1, ?)
+                   ON CONFLICT(link) DO UPDATE SET processed = 1, queued = 0, updated_at = excluded.updated_at""",
+                (link, time.time()),
+            )
+
+    def load_channels(self):
+        return self.conn.execute(
+            "SELECT link, source_channel, is_initial, queued, joined, processed, depth FROM channels"
+        ).fetchall()
+
+    def load_channel_sources(self):
+        return self.conn.execute("SELECT link, source_channel FROM channel_sources").fetchall()
+
+    def load_source_links(self, source_channel):
+        return [row[0] for row in self.conn.execute("SELECT link FROM channel_sources WHERE source_channel = ?", (source_channel,))]
+
+    def set_source_score(self, source_channel, compound_sum, message_count):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT OR REPLACE INTO source_scores (source_channel, compound_sum, message_count) VALUES (?, ?, ?)",
+                (source_channel, compound_sum, message_count),
+            )
+
+    def load_source_scores(self):
+        return self.conn.execute("SELECT source_channel, compound_sum, message_count FROM source_scores").fetchall()
+
+    # query: the keyword of a server-side search pass, None for the channel's plain history
+    def get_watermark(self, channel_id, query=None):
+        if query is None:
+            return self.conn.execute(
+                "SELECT max_id, min_id FROM channel_watermarks WHERE channel_id = ?", (channel_id,)
+            ).fetchone()
+        return self.conn.execute(
+            "SELECT max_id, min_id FROM search_watermarks WHERE channel_id = ? AND query = ?", (channel_id, query)
+        ).fetchone()
+
+    # watermarks: query -> (max_id, min_id), widened into the stored ranges in one transaction
+    def update_watermarks(self, channel_id, watermarks):
+        with self.transaction():
+            self._widen_watermarks(channel_id, watermarks, time.time())
+
+    def _widen_watermarks(self, channel_id, watermarks, now):
+        if watermarks.get(None) is not None:
+            max_id, min_id = watermarks[None]
+            self.conn.execute(
+                """INSERT INTO channel_watermarks (channel_id, max_id, min_id, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(channel_id) DO UPDATE SET
+                       max_id = MAX(channel_watermarks.max_id, excluded.max_id),
+                       min_id = MIN(channel_watermarks.min_id, excluded.min_id),
+                       updated_at = excluded.updated_at""",
+                (channel_id, max_id, min_id, now),
+            )
+        self.conn.executemany(
+            """INSERT INTO search_watermarks (channel_id, query, max_id, min_id, updated_at) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(channel_id, query) DO UPDATE SET
+                   max_id = MAX(search_watermarks.max_id, excluded.max_id),
+                   min_id = MIN(search_watermarks.min_id, excluded.min_id),
+                   updated_at = excluded.updated_at""",
+            [(channel_id, query, max_id, min_id, now) for query, (max_id, min_id) in watermarks.items() if query is not None],
+        )
+
+    # (plan, whether it belongs to this crawl rather than an earlier one), or None
+    def get_plan(self, channel_id):
+        row = self.conn.execute("SELECT plan, current FROM channel_plans WHERE channel_id = ?", (channel_id,)).fetchone()
+        return (json.loads(row[0]), bool(row[1])) if row else None
+
+    # progress: channel_id -> (watermarks by query, plan), as carried by the message pipeline.
+    # The watermarks and what is left to fetch move together, in one transaction.
+    def save_progress(self, progress):
+        now = time.time()
+        with self.transaction():
+            for channel_id, (watermarks, _) in progress.items():
+                self._widen_watermarks(channel_id, watermarks, now)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO channel_plans (channel_id, plan, current) VALUES (?, ?, 1)",
+                [(channel_id, json.dumps(plan)) for channel_id, (_, plan) in progress.items()],
+            )
+
+    def get_object(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM crawl_objects WHERE key = ?", (key,)).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    # A saved batch: the next batch number and the report aggregate including it
+    def save_batch(self, batch_counter, aggregator):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT INTO crawl_meta (key, value) VALUES ('batch_counter', ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (json.dumps(batch_counter),),
+            )
+            if aggregator is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO crawl_objects (key, value) VALUES ('report', ?)",
+                    (pickle.dumps(aggregator, protocol=pickle.HIGHEST_PROTOCOL),),
+                )
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM crawl_meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT INTO crawl_meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value)),
+            )
+
+    def close(self):
+        self.conn.close()
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -0,0 +1,51 @@
+from utils.logging import *
+from utils.chat_util import clean_link
+
+# Messages/dialogs returned per getDialogs request
+DIALOG_PAGE_SIZE = 100
+
+# In-memory set of chats/channels the account already belongs to, bulk-loaded
+# from the dialog list once at startup and kept current as joins succeed
+class DialogIndex:
+    def __init__(self):
+        self.peer_ids = set()
+        self.skipped_joins = 0
+
+    # A FloodWait pauses every caller on the rate controller and restarts the listing
+    async def load(self, client, rate_controller, entity_cache=None, max_retries=3):
+        from telethon.errors import FloodWaitError
+
+        for attempt in range(1, max_retries + 1):
+            try:
+                return await self._load(client, rate_controller, entity_cache)
+            except FloodWaitError as e:
+                print_warning(f"FloodWaitError while loading dialogs (attempt {attempt}/{max_retries}), waiting {e.seconds} seconds")
+                rate_controller.on_flood_wait(e.seconds)
+        print_warning(f"Could not load the dialog list; {len(self.peer_ids)} joined chats and channels are known")
+
+    async def _load(self, client, rate_controller, entity_cache):
+        from telethon.tl.types import Channel, Chat
+
+        loaded = 0
+        await rate_controller.acquire()
+        async for dialog in client.iter_dialogs():
+            loaded += 1
+            if loaded % DIALOG_PAGE_SIZE == 0:
+                rate_controller.on_success()
+                await rate_controller.acquire()
+            entity = dialog.entity
+            if isinstance(entity, (Channel, Chat)) and not getattr(entity, 'left', False):
+                self.peer_ids.add(entity.id)
+                # Dialogs come with full access hashes, so they also warm the entity cache,
+                # keyed like resolve_entity looks links up
+                link = clean_link(entity.username) if getattr(entity, 'username', None) else None
+                if entity_cache is not None and link:
+                    entity_cache.put(link, entity)
+        rate_controller.on_success()
+        print_info(f"Loaded {len(self.peer_ids)} joined chats and channels from {loaded} dialogs")
+
+    def is_member(self, entity):
+        return entity.id in self.peer_ids
+
+    def add(self, entity):
+        self.peer_ids.add(entity.id)
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import time
+
+# On-disk cache of resolved peers (cleaned link -> id, access hash, names) with a TTL.
+# Entities are rebuilt as minimal telethon objects carrying everything telethon needs
+# to build input peers offline, so a cache hit never costs a ResolveUsername RPC.
+class EntityCache:
+    def __init__(self, path='./state/entities.db', ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS resolved_entities (
+                link TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                peer_id INTEGER NOT NULL,
+                access_hash INTEGER,
+                username TEXT,
+                title TEXT,
+                resolved_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, link):
+        row = self.conn.execute(
+            "SELECT kind, peer_id, access_hash, username, title FROM resolved_entities WHERE link = ? AND resolved_at >= ?",
+            (link, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return build_entity(*row)
+
+    def put(self, link, entity):
+        record = entity_record(entity)
+        if record is None:
+            return
+        self.conn.execute(
+            """INSERT OR REPLACE INTO resolved_entities (link, kind, peer_id, access_hash, username, title, resolved_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (link, *record, time.time()),
+        )
+
+    def purge_expired(self):
+        self.conn.execute("DELETE FROM resolved_entities WHERE resolved_at < ?", (time.time() - self.ttl,))
+
+    def close(self):
+        self.conn.close()
+
+def entity_record(entity):
+    from telethon.tl.types import Channel, Chat, User
+
+    # "min" entities carry an access hash that is only valid inside the update that delivered them
+    if getattr(entity, 'min', False):
+        return None
+    if isinstance(entity, Channel):
+        return 'channel', entity.id, entity.access_hash, entity.username, entity.title
+    if isinstance(entity, User):
+        return 'user', entity.id, entity.access_hash, entity.username, None
+    if isinstance(entity, Chat):
+        return 'chat', entity.id, None, None, entity.title
+    return None
+
+def build_entity(kind, peer_id, access_hash, username, title):
+    from telethon.tl.types import Channel, Chat, ChatPhotoEmpty, User
+
+    if kind == 'channel':
+        return Channel(id=peer_id, title=title, photo=ChatPhotoEmpty(), date=None, access_hash=access_hash, username=username)
+    if kind == 'user':
+        return User(id=peer_id, access_hash=access_hash, username=username)
+    return Chat(id=peer_id, title=title, photo=ChatPhotoEmpty(), participants_count=0, date=None, version=0)
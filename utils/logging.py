@@ -1,28 +1,213 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
 from colorama import Back, Fore, Style, init
 
 init(autoreset=True)
 
+__all__ = [
+    'Back', 'Fore', 'Style', 'init', 'LIGHT_PURPLE', 'PURPLE_BLUE', 'BOLD_WHITE',
+    'configure_logging', 'shutdown_logging', 'count_progress', 'log_message',
+    'print_debug', 'print_plain', 'print_info', 'print_success', 'print_warning', 'print_error', 'print_header', 'print_subheader',
+]
+
 LIGHT_PURPLE    = '\033[38;2;100;100;255m'
 PURPLE_BLUE     = '\033[38;2;100;100;255m'
 LIGHT_PURPLE    = '\033[38;2;200;180;255m'
 BOLD_WHITE      = '\033[1;37m'
+CLEAR_LINE      = '\r\033[K'
+
+LEVELS = {'debug': 10, 'info': 20, 'success': 25, 'warning': 30, 'error': 40}
+
+_STOP = object()
+
+def _format_console(level, kind, message, fields):
+    if kind == 'header':
+        return f"\n{PURPLE_BLUE}{Style.BRIGHT}{message}\n{PURPLE_BLUE}{'-' * len(message)}{Style.RESET_ALL}"
+    if kind == 'subheader':
+        return f"\n{LIGHT_PURPLE}{Style.BRIGHT}{message}\n{LIGHT_PURPLE}{'-' * len(message)}{Style.RESET_ALL}"
+    if kind == 'plain':
+        return message
+    if kind == 'message':
+        channel = f"{Fore.CYAN}{Style.BRIGHT}{fields.get('channel')}{Style.RESET_ALL}"
+        if fields.get('affiliated_channel'):
+            channel += f".{Fore.YELLOW}{Style.BRIGHT} <-- {fields['affiliated_channel']}{Style.RESET_ALL}"
+        return f"{PURPLE_BLUE}ℹ {BOLD_WHITE}Message from {channel}: {message}"
+    if level == 'success':
+        return f"{LIGHT_PURPLE}✔ {BOLD_WHITE}{message}"
+    if level == 'warning':
+        return f"{Fore.YELLOW}{Style.BRIGHT}⚠ {BOLD_WHITE}{message}"
+    if level == 'error':
+        return f"{Fore.RED}✘ {message}"
+    return f"{PURPLE_BLUE}ℹ {BOLD_WHITE}{message}"
+
+# Logging backend: callers only enqueue records, a background thread does the
+# console output, the JSON-lines file and the rate-limited progress line, so a
+# slow terminal never stalls the event loop
+class LogPipeline:
+    def __init__(self):
+        self.console_level = LEVELS['info']
+        self.file_level = LEVELS['info']
+        self.echo_messages = False
+        self.log_path = None
+        self.progress_interval = 1.0
+        self.counters = {}
+        self._reset()
+
+    def _reset(self):
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+
+    def configure(self, log_path=None, console_level='info', file_level='info', echo_messages=False, progress_interval=1.0):
+        self.shutdown()
+        self.log_path = log_path
+        self.console_level = LEVELS[console_level]
+        self.file_level = LEVELS[file_level]
+        self.echo_messages = echo_messages
+        self.progress_interval = progress_interval
+        self.counters = {}
+        self.started_at = time.monotonic()
+
+    def wants_message(self):
+        return self.echo_messages or (self.log_path is not None and self.file_level <= LEVELS['debug'])
+
+    def emit(self, level, message, kind=None, **fields):
+        if self.thread is None:
+            self._start()
+        self.queue.put((time.time(), level, kind, message, fields))
+
+    def _start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='telefi-logging', daemon=True)
+                self.thread.start()
+                atexit.register(self.shutdown)
+
+    def _run(self):
+        log_file = None
+        if self.log_path:
+            os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+            log_file = open(self.log_path, 'a', encoding='utf-8')
+        show_progress = self.progress_interval and sys.stdout.isatty()
+        progress_shown = False
+        rendered = None
+        next_render = time.monotonic() + self.progress_interval
+        try:
+            while True:
+                try:
+                    record = self.queue.get(timeout=self.progress_interval or None)
+                except queue.Empty:
+                    record = None
+                if record is _STOP:
+                    break
+                if record is not None:
+                    progress_shown = self._write(record, log_file, progress_shown)
+                    # Drain whatever else is queued before touching the file or progress line again
+                    while True:
+                        try:
+                            record = self.queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if record is _STOP:
+                            return
+                        progress_shown = self._write(record, log_file, progress_shown)
+                    if log_file is not None:
+                        log_file.flush()
+                if show_progress and self.counters and time.monotonic() >= next_render:
+                    line = self._progress_line()
+                    if line != rendered or not progress_shown:
+                        sys.stdout.write(f"{CLEAR_LINE}{line}")
+                        sys.stdout.flush()
+                        rendered = line
+                        progress_shown = True
+                    next_render = time.monotonic() + self.progress_interval
+        finally:
+            if progress_shown:
+                sys.stdout.write(CLEAR_LINE)
+                sys.stdout.flush()
+            if log_file is not None:
+                log_file.close()
+
+    def _write(self, record, log_file, progress_shown):
+        timestamp, level, kind, message, fields = record
+        rank = LEVELS[level]
+        is_message = kind == 'message'
+        if (self.echo_messages if is_message else rank >= self.console_level):
+            if progress_shown:
+                sys.stdout.write(CLEAR_LINE)
+                progress_shown = False
+            print(_format_console(level, kind, message, fields))
+        if log_file is not None and rank >= self.file_level:
+            entry = {'ts': datetime.fromtimestamp(timestamp, timezone.utc).isoformat(), 'level': level, 'msg': str(message)}
+            if kind:
+                entry['kind'] = kind
+            entry.update(fields)
+            log_file.write(json.dumps(entry, default=str, ensure_ascii=False) + '\n')
+        return progress_shown
+
+    def _progress_line(self):
+        counters = dict(self.counters)
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        parts = [f"{value} {name}" for name, value in counters.items()]
+        if 'messages' in counters:
+            parts.append(f"{counters['messages'] / elapsed:.1f} msg/s")
+        return f"{PURPLE_BLUE}⟳ {BOLD_WHITE}{' | '.join(parts)}{Style.RESET_ALL}"
+
+    def shutdown(self):
+        thread = self.thread
+        if thread is None:
+            return
+        self.queue.put(_STOP)
+        thread.join()
+        self.thread = None
+
+pipeline = LogPipeline()
+# A forked child (scoring workers) must not inherit the parent's queue or dead thread
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=pipeline._reset)
+
+def configure_logging(log_path=None, console_level='info', file_level='info', echo_messages=False, progress_interval=1.0):
+    pipeline.configure(log_path, console_level, file_level, echo_messages, progress_interval)
+
+def shutdown_logging():
+    pipeline.shutdown()
+
+def count_progress(name, amount=1):
+    pipeline.counters[name] = pipeline.counters.get(name, 0) + amount
+
+def log_message(channel, text, affiliated_channel=None):
+    # Per-message record: echoed to the console only with echo_messages, written to the file at debug level
+    if pipeline.wants_message():
+        pipeline.emit('debug', text, kind='message', channel=channel, affiliated_channel=affiliated_channel)
+
+def print_debug(message):
+    pipeline.emit('debug', message)
 
 def print_info(message):
-    print(f"{PURPLE_BLUE}ℹ {BOLD_WHITE}{message}")
+    pipeline.emit('info', message)
 
 def print_success(message):
-    print(f"{LIGHT_PURPLE}✔ {BOLD_WHITE}{message}")
+    pipeline.emit('success', message)
 
 def print_warning(message):
-    print(f"{Fore.YELLOW}{Style.BRIGHT}⚠ {BOLD_WHITE}{message}")
+    pipeline.emit('warning', message)
 
 def print_error(message):
-    print(f"{Fore.RED}✘ {message}")
+    pipeline.emit('error', message)
+
+def print_plain(message):
+    pipeline.emit('info', message, kind='plain')
 
 def print_header(message):
-    print(f"\n{PURPLE_BLUE}{Style.BRIGHT}{message}")
-    print(f"{PURPLE_BLUE}{'-' * len(message)}{Style.RESET_ALL}")
+    pipeline.emit('info', message, kind='header')
 
 def print_subheader(message):
-    print(f"\n{LIGHT_PURPLE}{Style.BRIGHT}{message}")
-    print(f"{LIGHT_PURPLE}{'-' * len(message)}{Style.RESET_ALL}")
+    pipeline.emit('info', message, kind='subheader')
@@ -0,0 +1,263 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from a cached lookup up to a slow RPC or a FloodWait-delayed page
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Per-message scoring cost is far below RPC latency
+SCORING_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            samples = list(self._samples())
+        lines.extend(samples)
+        return lines
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        if not self.label_names:
+            self.values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def _samples(self):
+        for key, value in self.values.items():
+            yield f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def set_function(self, function):
+        # Sampled at export time; returns a number, or {label value: number} for a single label
+        self.function = function
+
+    def _samples(self):
+        values = self.values
+        if self.function is not None:
+            try:
+                sampled = self.function()
+            except Exception:
+                sampled = None
+            if isinstance(sampled, dict):
+                values = {(str(label),): value for label, value in sampled.items()}
+            elif sampled is not None:
+                values = {(): sampled}
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def summary(self, **labels):
+        # (count, sum) of everything observed for these labels
+        state = self.values.get(self._key(labels))
+        return (state[2], state[1]) if state else (0, 0.0)
+
+    # Times a block and observes its duration: `with histogram.time(rpc='join'):`
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _samples(self):
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{_format_labels(self.label_names, key, ("le", _format_value(bound)))} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self.label_names, key)} {count}'
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), function=None):
+        return self.register(Gauge(name, documentation, labels, function))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def process_rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        # No procfs (macOS, Windows): fall back to the peak RSS
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+_started_at = time.monotonic()
+
+registry = MetricsRegistry()
+
+messages_scraped = registry.counter('telefi_messages_scraped_total', 'Messages kept after filtering and deduplication')
+messages_per_second = registry.gauge(
+    'telefi_messages_scraped_per_second', 'Average messages scraped per second since start',
+    function=lambda: messages_scraped.value() / max(time.monotonic() - _started_at, 1e-9),
+)
+rpc_latency = registry.histogram('telefi_rpc_duration_seconds', 'Telegram RPC latency; iter_messages is timed per page', labels=('rpc',))
+flood_wait_seconds = registry.counter('telefi_flood_wait_seconds_total', 'Seconds Telegram asked us to wait through FloodWaitError')
+flood_waits = registry.counter('telefi_flood_waits_total', 'FloodWaitError responses')
+frontier_channels = registry.gauge('telefi_frontier_channels', 'Channels queued and not yet started, by crawl depth (1-based)', labels=('depth',))
+channels_processed = registry.counter('telefi_channels_processed_total', 'Channels fully processed')
+pipeline_queue_depth = registry.gauge('telefi_pipeline_queue_depth', 'Items waiting in front of each crawl pipeline stage', labels=('stage',))
+batch_flush_latency = registry.histogram('telefi_batch_flush_duration_seconds', 'Time to collect scores and write one batch')
+batch_messages = registry.counter('telefi_batch_messages_total', 'Messages written to batch files')
+scoring_seconds_per_message = registry.histogram('telefi_scoring_seconds_per_message', 'Worker CPU time per scored message, averaged per chunk', buckets=SCORING_BUCKETS)
+process_rss = registry.gauge('telefi_process_resident_memory_bytes', 'Resident set size of the crawler process', function=process_rss_bytes)
+
+# Exports the registry as a Prometheus text file (rewritten atomically every
+# interval seconds, for node_exporter's textfile collector) and/or on a local
+# HTTP endpoint at /metrics
+class MetricsExporter:
+    def __init__(self, textfile=None, port=None, host='127.0.0.1', interval=15.0, registry=registry):
+        self.textfile = textfile
+        self.port = port
+        self.host = host
+        self.interval = interval
+        self.registry = registry
+        self.server = None
+        self.writer = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        if self.port:
+            registry = self.registry
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split('?')[0] not in ('/', '/metrics'):
+                        self.send_error(404)
+                        return
+                    body = registry.render().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self.server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, name='telefi-metrics-http', daemon=True).start()
+        if self.textfile:
+            self.writer = threading.Thread(target=self._write_loop, name='telefi-metrics-file', daemon=True)
+            self.writer.start()
+        return self
+
+    def write_textfile(self):
+        os.makedirs(os.path.dirname(self.textfile) or '.', exist_ok=True)
+        temp_path = f'{self.textfile}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.registry.render())
+        os.replace(temp_path, self.textfile)
+
+    def _write_loop(self):
+        while not self.stopped.wait(self.interval):
+            self.write_textfile()
+
+    def stop(self):
+        self.stopped.set()
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+            # Final snapshot so the file reflects the finished crawl
+            self.write_textfile()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
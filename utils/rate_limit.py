@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from utils.logging import *
+from utils import metrics
+
+# Global token bucket shared by every Telegram RPC path.
+# The refill rate grows additively while requests succeed and is cut
+# multiplicatively on FloodWaitError, which also pauses every caller for
+# exactly the number of seconds Telegram asked for.
+class AdaptiveRateController:
+    def __init__(self, initial_rate=5.0, min_rate=0.5, max_rate=30.0, increase=1.0, decrease=0.5, burst=5):
+        self.rate = float(initial_rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.resume_at = 0.0
+        self.requests = 0
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0
+        self.started_at = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def remaining(self):
+        return max(0.0, self.resume_at - time.monotonic())
+
+    async def wait(self):
+        delay = self.remaining()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.remaining()
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                await self.wait()
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.requests += 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        # Additive increase: roughly +increase req/s for every second of clean traffic
+        self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_flood_wait(self, seconds):
+        self.flood_waits += 1
+        self.flood_wait_seconds += seconds
+        metrics.flood_waits.inc()
+        metrics.flood_wait_seconds.inc(seconds)
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = 0.0
+        resume_at = time.monotonic() + seconds
+        if resume_at > self.resume_at:
+            self.resume_at = resume_at
+            print_warning(f"FloodWait: pausing all requests for {seconds} seconds, rate lowered to {self.rate:.2f} req/s")
+
+    def current_rate(self):
+        return self.rate
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            'rate': self.rate,
+            'requests': self.requests,
+            'observed_rate': self.requests / elapsed,
+            'flood_waits': self.flood_waits,
+            'flood_wait_seconds': self.flood_wait_seconds,
+        }
+
+    def display_status(self):
+        stats = self.stats()
+        print_plain(f"  Request rate: {stats['rate']:.2f} req/s (observed {stats['observed_rate']:.2f} req/s over {stats['requests']} requests)")
+        print_plain(f"  FloodWaits: {stats['flood_waits']} ({stats['flood_wait_seconds']} seconds)")
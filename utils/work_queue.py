@@ -0,0 +1,150 @@
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from utils.crawl_state import _Transaction
+
+# Durable queue of scraped message pages between the crawler and analysis workers,
+# in a SQLite database. Workers lease items for lease_seconds and delete them once
+# their batch is written; a worker that dies simply lets its leases expire, and the
+# items go to the next worker. Delivery is at least once: a crash between writing a
+# batch and acknowledging it writes that batch again.
+#
+# WAL mode needs every process on the same host. For a database on shared storage
+# read by workers on other hosts, pass wal=False to use a rollback journal.
+class WorkQueue:
+    def __init__(self, path='./state/queue.db', lease_seconds=300, max_attempts=5, wal=True):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self.conn.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+        self.conn.execute("PRAGMA synchronous=NORMAL" if wal else "PRAGMA synchronous=FULL")
+        self.create_schema()
+
+    def create_schema(self):
+        with self.transaction():
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS queue_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel_name TEXT,
+                    affiliated_channel TEXT,
+                    rows TEXT NOT NULL,
+                    message_count INTEGER NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS queue_items_lease ON queue_items (lease_expires, id)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS queue_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+
+    def transaction(self):
+        return _Transaction(self.conn)
+
+    # pages: (rows, channel_name, affiliated_channel), rows as built by the crawler
+    def publish(self, pages):
+        now = time.time()
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT INTO queue_items (channel_name, affiliated_channel, rows, message_count, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (channel_name, affiliated_channel, json.dumps([encode_row(row) for row in rows]), len(rows), now)
+                    for rows, channel_name, affiliated_channel in pages
+                ],
+            )
+
+    # Up to max_items items nobody holds a live lease on, oldest first, as
+    # (id, rows, channel_name, affiliated_channel)
+    def lease(self, owner, max_items=10):
+        now = time.time()
+        with self.transaction():
+            items = self.conn.execute(
+                """SELECT id, rows, channel_name, affiliated_channel FROM queue_items
+                   WHERE lease_expires < ? AND attempts < ? ORDER BY id LIMIT ?""",
+                (now, self.max_attempts, max_items),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE queue_items SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                [(owner, now + self.lease_seconds, item[0]) for item in items],
+            )
+        return [(item_id, [decode_row(row) for row in json.loads(rows)], channel_name, affiliated_channel) for item_id, rows, channel_name, affiliated_channel in items]
+
+    # Done with these items; ignored for items whose lease has passed to another worker
+    def ack(self, ids, owner):
+        with self.transaction():
+            self.conn.executemany("DELETE FROM queue_items WHERE id = ? AND lease_owner = ?", [(item_id, owner) for item_id in ids])
+
+    # Hand items back without counting the attempt, e.g. on shutdown
+    def release(self, ids, owner):
+        with self.transaction():
+            self.conn.executemany(
+                "UPDATE queue_items SET lease_owner = NULL, lease_expires = 0, attempts = attempts - 1 WHERE id = ? AND lease_owner = ?",
+                [(item_id, owner) for item_id in ids],
+            )
+
+    # Batch numbers are drawn from the queue so workers sharing a batch directory never collide
+    def next_batch_number(self):
+        with self.transaction():
+            number = self.get_meta('batch_counter', 1)
+            self.set_meta('batch_counter', number + 1, transaction=False)
+        return number
+
+    def stats(self):
+        now = time.time()
+        ready, leased, failed, messages = self.conn.execute(
+            """SELECT
+                   COALESCE(SUM(lease_expires < ? AND attempts < ?), 0),
+                   COALESCE(SUM(lease_expires >= ?), 0),
+                   COALESCE(SUM(lease_expires < ? AND attempts >= ?), 0),
+                   COALESCE(SUM(message_count), 0)
+               FROM queue_items""",
+            (now, self.max_attempts, now, now, self.max_attempts),
+        ).fetchone()
+        return {'ready': ready, 'leased': leased, 'failed': failed, 'messages': messages}
+
+    # The crawler marks itself running while it publishes, so workers know when an empty queue is final
+    def set_producer_running(self, running):
+        self.set_meta('producer_running', bool(running))
+
+    def producer_running(self):
+        return self.get_meta('producer_running', False)
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM queue_meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value, transaction=True):
+        statement = "INSERT INTO queue_meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+        if not transaction:
+            self.conn.execute(statement, (key, json.dumps(value)))
+            return
+        with self.transaction():
+            self.conn.execute(statement, (key, json.dumps(value)))
+
+    def close(self):
+        self.conn.close()
+
+# Rows are [sender_id, date, text, sentiment, compound]; dates travel as ISO strings
+def encode_row(row):
+    sender_id, date, text = row[:3]
+    return [sender_id, date.isoformat() if isinstance(date, datetime) else date, text]
+
+def decode_row(row):
+    sender_id, date, text = row
+    try:
+        date = datetime.fromisoformat(date) if isinstance(date, str) else date
+    except ValueError:
+        pass
+    return [sender_id, date, text, None, None]